@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# ---------------------------------------------------------------------------
+# End-to-end benchmark of `gms-pgb download` against the local mock portal.
+# Each scenario runs the real command in a fresh working directory with
+# GMS_BASE_URL pointing at mock_portal.py and reports items per minute,
+# per-step latency (from the step spans the script writes) and the peak RSS
+# of the script's whole process tree (Python, chromedriver and Chrome).
+#
+# Failure injection: a browser crash (the harness kills Chrome mid-run),
+# missing export buttons and slow downloads (both served by the mock).
+#
+#     python benchmark.py                          # every scenario
+#     python benchmark.py --scenarios baseline,workers --points 6 --output bench.json
+import os
+import sys
+import json
+import glob
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+
+from mock_portal import MockPortal, add_config_arguments, config_from_args
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Extra download arguments, mock portal overrides and injected failures.
+SCENARIOS = {
+    "baseline": {},
+    "workers": {"args": ["--workers", "3"]},
+    "tabs": {"args": ["--tabs", "4"]},
+    "adaptive": {"args": ["--tabs", "8", "--adaptive"]},
+    "http": {"args": ["--http"]},
+    "browser-crash": {"crash_after": 15},
+    "missing-export": {"portal": {"missing_export_rate": 0.3}},
+    "sparse": {"portal": {"empty_rate": 0.3}},
+    "slow-downloads": {"portal": {"download_delay": 5.0}},
+}
+
+BROWSER_NAMES = ("chrome", "chromium", "chromium-browse", "headless_shell", "chrome-headless")
+
+# ---------------------------------------------------------------------------
+# Process tree helpers (Linux /proc).
+def process_table():
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        table[int(entry)] = (ppid, name)
+    return table
+
+def descendants(root_pid, table=None):
+    table = table or process_table()
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    found, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        found.append(pid)
+        stack.extend(children.get(pid, []))
+    return found
+
+def process_tree_rss(root_pid):
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in descendants(root_pid):
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except OSError:
+            pass
+    return total
+
+# Kill the top-level browser process(es) below root_pid, as a crash would.
+def kill_browser(root_pid):
+    table = process_table()
+    killed = 0
+    for pid in descendants(root_pid, table):
+        ppid, name = table.get(pid, (0, ""))
+        if name in BROWSER_NAMES and table.get(ppid, (0, ""))[1] not in BROWSER_NAMES:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                killed += 1
+            except OSError:
+                pass
+    return killed
+
+# ---------------------------------------------------------------------------
+def run_scenario(name, scenario, portal_args, timeout):
+    config = config_from_args(portal_args)
+    for key, value in scenario.get("portal", {}).items():
+        setattr(config, key, value)
+    workdir = tempfile.mkdtemp(prefix=f"gms-bench-{name}-")
+    with MockPortal(config) as portal:
+        env = dict(os.environ, GMS_BASE_URL=portal.url, GMS_RUN_ID=name,
+                   WEBSITE_USERNAME="bench", WEBSITE_PASSWORD="bench",
+                   PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+        command = [sys.executable, "-m", "gms_pgb", "download", "--full-month", "--refresh-catalog"] + scenario.get("args", [])
+        log_path = os.path.join(workdir, "output.log")
+        start = time.monotonic()
+        peak_rss = crashes = 0
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            while process.poll() is None:
+                elapsed = time.monotonic() - start
+                if elapsed > timeout:
+                    process.kill()
+                    break
+                if "crash_after" in scenario and not crashes and elapsed >= scenario["crash_after"]:
+                    crashes = kill_browser(process.pid)
+                peak_rss = max(peak_rss, process_tree_rss(process.pid))
+                time.sleep(0.2)
+            process.wait()
+        wall = time.monotonic() - start
+        portal_stats = portal.stats()
+        expected = portal.items
+
+    downloaded = len(glob.glob(os.path.join(workdir, "downloads", "*", "PGB Daily Gas Movement - *.xlsx")))
+    spans = []
+    for path in glob.glob(os.path.join(workdir, "downloads", "metrics", "steps-*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    from gms_pgb.metrics import summarize_spans
+
+    return {
+        "scenario": name,
+        "exit_code": process.returncode,
+        "wall_seconds": round(wall, 2),
+        "items_expected": expected,
+        "items_downloaded": downloaded,
+        "items_per_minute": round(downloaded / wall * 60, 2) if wall else 0.0,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+        "browser_kills": crashes,
+        "portal": portal_stats,
+        "steps": {step: {k: round(v, 3) for k, v in stats.items()}
+                  for step, stats in summarize_spans(spans, lambda s: s["step"]).items()},
+        "workdir": workdir,
+    }
+
+def print_report(results):
+    print(f"{'scenario':<16}{'items':>9}{'wall s':>9}{'items/min':>11}{'peak MB':>9}{'exit':>6}")
+    for result in results:
+        items = f"{result['items_downloaded']}/{result['items_expected']}"
+        print(f"{result['scenario']:<16}{items:>9}{result['wall_seconds']:>9.1f}"
+              f"{result['items_per_minute']:>11.1f}{result['peak_rss_mb']:>9.1f}{result['exit_code']:>6}")
+    for result in results:
+        print(f"\n{result['scenario']} steps (count, p50, p95, max in seconds):")
+        for step, stats in sorted(result["steps"].items()):
+            print(f"  {step:<26}{stats['count']:>5}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['max']:>9.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark gms-pgb download against the local mock GMS portal.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run (default: all of {', '.join(SCENARIOS)}).")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds before a scenario is killed (default: 1800).")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = [run_scenario(name, SCENARIOS[name], args, args.timeout) for name in names]
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result["exit_code"] == 0 for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
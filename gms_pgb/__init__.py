@@ -0,0 +1,4 @@
+# Download PGB Daily Gas Movement workbooks from the GMS portal. The command
+# line lives in gms_pgb.cli (the gms-pgb console script); the modules below it
+# can be imported on their own, and only browser.py and runner.py need
+# Selenium.
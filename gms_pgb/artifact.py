@@ -0,0 +1,126 @@
+import os
+import time
+import zlib
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .config import logger
+
+# ---------------------------------------------------------------------------
+# ZIP artifact of a month folder. xlsx workbooks are already zip archives, so
+# they are stored as they are; only text logs and change logs are deflated.
+# The archive is updated incrementally: an entry whose size and CRC-32 match
+# the previous archive is copied over byte for byte, and only new or changed
+# files are read and (for logs) compressed, in parallel threads. Workbooks
+# whose data did not change are not rewritten by the download, so they are
+# reused here. The log of the run in progress, worker download directories
+# and partial files are left out.
+DEFLATE_SUFFIXES = (".txt", ".log", ".jsonl")
+SKIP_SUFFIXES = (".part", ".crdownload", ".tmp")
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+def artifact_entries(directory):
+    entries = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            if file.endswith(SKIP_SUFFIXES) or file_path == config.log_filename:
+                continue
+            entries[os.path.relpath(file_path, start=directory).replace(os.sep, "/")] = file_path
+    return entries
+
+def file_crc32(path):
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+# An entry of the previous archive can be reused when the file on disk has
+# the same size and the same CRC-32 (the modification time is checked first
+# to skip reading files that were not touched).
+def entry_unchanged(info, file_path):
+    if info is None or info.flag_bits & 0x08 or info.file_size != os.path.getsize(file_path):
+        return False
+    if info.date_time == zipfile.ZipInfo.from_file(file_path, strict_timestamps=False).date_time:
+        return True
+    return info.CRC == file_crc32(file_path)
+
+# Read and, for logs, deflate one file. Runs in a worker thread: zlib releases
+# the GIL, so several files are compressed at once.
+def prepare_entry(arcname, file_path):
+    info = zipfile.ZipInfo.from_file(file_path, arcname, strict_timestamps=False)
+    with open(file_path, "rb") as f:
+        data = f.read()
+    info.file_size = len(data)
+    info.CRC = zlib.crc32(data)
+    if arcname.endswith(DEFLATE_SUFFIXES):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+        info.compress_type = zipfile.ZIP_DEFLATED
+    else:
+        info.compress_type = zipfile.ZIP_STORED
+    info.compress_size = len(data)
+    return info, data
+
+# Append already compressed entry data to an archive open for writing. zipfile
+# has no public API for this, so the entry is registered the way ZipFile.write
+# does it and the central directory is written on close as usual.
+def write_raw_entry(archive, info, local_record):
+    info.header_offset = archive.fp.tell()
+    archive.fp.write(local_record)
+    archive.filelist.append(info)
+    archive.NameToInfo[info.filename] = info
+    archive.start_dir = archive.fp.tell()
+    archive._didModify = True
+
+def copy_raw_entry(source, archive, info):
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(LOCAL_HEADER.size)
+    fields = LOCAL_HEADER.unpack(header)
+    name_length, extra_length = fields[-2], fields[-1]
+    local_record = header + source.fp.read(name_length + extra_length + info.compress_size)
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    for attribute in ("compress_type", "CRC", "compress_size", "file_size", "external_attr",
+                      "create_system", "flag_bits", "extract_version", "create_version", "extra"):
+        setattr(copied, attribute, getattr(info, attribute))
+    write_raw_entry(archive, copied, local_record)
+
+def compress_downloads_dir(directory, zip_filename, threads=None):
+    start = time.monotonic()
+    entries = artifact_entries(directory)
+    previous = None
+    if os.path.exists(zip_filename):
+        try:
+            previous = zipfile.ZipFile(zip_filename)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.warning(f"Rebuilding '{zip_filename}' from scratch: {e}")
+    previous_infos = {info.filename: info for info in previous.infolist()} if previous else {}
+    reused = [name for name, path in entries.items() if entry_unchanged(previous_infos.get(name), path)]
+    reused_names = set(reused)
+    changed = [name for name in entries if name not in reused_names]
+    removed = [name for name in previous_infos if name not in entries]
+    if previous and not changed and not removed:
+        previous.close()
+        logger.info(f"'{zip_filename}' is up to date ({len(entries)} entries).")
+        return
+
+    partial_path = zip_filename + ".part"
+    written = 0
+    try:
+        with zipfile.ZipFile(partial_path, "w") as archive, \
+                ThreadPoolExecutor(max_workers=threads or min(8, os.cpu_count() or 1)) as pool:
+            for name in reused:
+                copy_raw_entry(previous, archive, previous_infos[name])
+            for info, data in pool.map(lambda name: prepare_entry(name, entries[name]), changed):
+                write_raw_entry(archive, info, info.FileHeader() + data)
+                written += len(data)
+    finally:
+        if previous:
+            previous.close()
+    os.replace(partial_path, zip_filename)
+    logger.info(f"Compressed files into {zip_filename}: {len(changed)} new or changed, {len(reused)} reused, "
+                f"{len(removed)} removed, {written / 2 ** 20:.1f} MiB written in {time.monotonic() - start:.1f}s")
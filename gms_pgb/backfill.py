@@ -0,0 +1,116 @@
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import browser, metrics
+from .config import logger, month_folder_of, parse_portal_date, format_portal_date
+from .state import get_manifest, completed_items, filter_completed
+from .catalog import save_catalog, apply_rediscoveries, catalog_work_items
+from .runner import new_results, merge_results, open_catalog, run_worker, log_summary
+
+# ---------------------------------------------------------------------------
+# Backfill (--from/--to). The date range is split into windows of at most
+# --window-days days that never cross a month boundary, and each window is a
+# full pass over the catalog in its own worker session (--workers windows run
+# at once, each with --tabs tabs). Files land in the "%B %Y" folder of their
+# window's month, merged by gas day, so windows may finish in any order. Every
+# window's outcome is kept in the manifest; with --resume, finished items of a
+# window are skipped and finished windows cost nothing.
+def get_backfill_table():
+    conn = get_manifest()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS backfill_windows ("
+        " start_date TEXT NOT NULL, end_date TEXT NOT NULL, status TEXT NOT NULL,"
+        " items INTEGER NOT NULL, downloaded INTEGER NOT NULL, skipped INTEGER NOT NULL,"
+        " updated_at TEXT NOT NULL,"
+        " PRIMARY KEY (start_date, end_date))"
+    )
+    return conn
+
+def record_window(start_date_str, end_date_str, status, items, downloaded=0, skipped=0):
+    conn = get_backfill_table()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO backfill_windows VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (start_date_str, end_date_str, status, items, downloaded, skipped,
+             datetime.now().isoformat(timespec="seconds"))
+        )
+
+def month_end(day):
+    next_month = day.replace(day=28) + timedelta(days=4)
+    return next_month - timedelta(days=next_month.day)
+
+# Portal date strings (start, end) of the windows covering first_day to last_day.
+def backfill_windows(first_day, last_day, window_days):
+    windows = []
+    start = first_day
+    while start <= last_day:
+        end = min(start + timedelta(days=window_days - 1), month_end(start), last_day)
+        windows.append((format_portal_date(start), format_portal_date(end)))
+        start = end + timedelta(days=1)
+    return windows
+
+# Month folders the windows write to.
+def backfill_month_folders(windows):
+    return list(dict.fromkeys(month_folder_of(parse_portal_date(start)) for start, end in windows))
+
+def run_backfill(args, windows):
+    results = new_results()
+    catalog = open_catalog(args, keep_browser=False)
+    if browser.driver is not None:
+        browser.quit_driver()
+    network_names = list(catalog["networks"])
+    work_items = catalog_work_items(catalog, results)
+
+    tasks = []
+    for start_date_str, end_date_str in windows:
+        items = work_items
+        if args.resume:
+            items = filter_completed(work_items, completed_items(end_date_str), results)
+        if items:
+            tasks.append((start_date_str, end_date_str, items))
+        else:
+            logger.info(f"Window {start_date_str} - {end_date_str} is already complete.")
+            record_window(start_date_str, end_date_str, "done", len(work_items))
+    logger.info(f"Backfilling {len(windows)} windows from {windows[0][0]} to {windows[-1][1]}: "
+                f"{len(tasks)} to run, {min(args.workers, len(tasks))} at a time, {len(work_items)} items each.")
+
+    adaptive = None
+    if args.adaptive:
+        adaptive = {"min_concurrency": args.min_concurrency, "latency_factor": args.latency_factor}
+    if tasks:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {}
+            for window_id, (start_date_str, end_date_str, items) in enumerate(tasks, start=1):
+                record_window(start_date_str, end_date_str, "running", len(items))
+                future = pool.submit(run_worker, window_id, items, start_date_str, end_date_str, {}, args.tabs, adaptive)
+                futures[future] = (start_date_str, end_date_str, items)
+            for finished, future in enumerate(as_completed(futures), start=1):
+                start_date_str, end_date_str, items = futures[future]
+                try:
+                    window_results = future.result()
+                except Exception as e:
+                    logger.error(f"Window {start_date_str} - {end_date_str} crashed: {e}")
+                    window_results = new_results()
+                    window_results["skipped"] = [f"{network} - {measurement_point}" for network, measurement_point in items]
+                merge_results(results, window_results)
+                downloaded, skipped = len(window_results["downloaded"]), len(window_results["skipped"])
+                record_window(start_date_str, end_date_str, "incomplete" if skipped else "done", len(items),
+                              downloaded, skipped)
+                logger.info(f"Window {start_date_str} - {end_date_str} finished ({finished}/{len(tasks)}): "
+                            f"{downloaded} downloaded, {skipped} skipped.")
+
+    if results["rediscovered"]:
+        apply_rediscoveries(catalog, results["rediscovered"])
+        save_catalog(catalog)
+
+    # Durations are not recorded: a backfill window is much longer than the
+    # daily incremental one, so its items would skew the daily schedule.
+    results["waits"].extend(browser.wait_timings)
+    results["sessions"].extend(browser.session_stats)
+    results["spans"].extend(metrics.step_spans)
+    metrics.write_prometheus_metrics(results["spans"])
+    log_summary(network_names, results)
+    logger.info("Backfill finished.")
+    return results
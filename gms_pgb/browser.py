@@ -0,0 +1,728 @@
+import os
+import time
+import json
+import threading
+from datetime import datetime
+
+from . import config
+from .config import base_download_dir, gms_base_url, gms_home_url, logger
+from .metrics import timed_step
+from .retry import RETRY_POLICIES, DOWNLOAD_START_TIMEOUT, backoff
+
+# ---------------------------------------------------------------------------
+# Selenium and WebDriver imports
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.common.exceptions import (WebDriverException, TimeoutException, NoSuchElementException,
+                                        StaleElementReferenceException, SessionNotCreatedException)
+
+# ---------------------------------------------------------------------------
+# Configure Chrome options for headless mode (GitHub Actions). The lean
+# profile (default; GMS_LEAN_BROWSER=0 or --full-browser turns it off) runs
+# the new headless mode in a small fixed viewport, without extensions,
+# background networking or component updates, and blocks images, fonts, media
+# and analytics through DevTools. The portal is driven by its scripts and
+# stylesheets, which still load. GMS_CHROME_BINARY points at another Chrome
+# build, such as chrome-headless-shell.
+lean_browser = os.environ.get("GMS_LEAN_BROWSER", "1") != "0"
+chrome_binary = os.environ.get("GMS_CHROME_BINARY")
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3", "*.ogg", "*.wav",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*hotjar.com*",
+]
+
+def build_chrome_options(download_dir):
+    chrome_options = Options()
+    if chrome_binary:
+        chrome_options.binary_location = chrome_binary
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--lang=ms-MY")
+    if lean_browser:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1280,800")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-background-networking")
+        chrome_options.add_argument("--disable-component-update")
+        chrome_options.add_argument("--disable-default-apps")
+        chrome_options.add_argument("--disable-sync")
+        chrome_options.add_argument("--no-first-run")
+        chrome_options.add_argument("--mute-audio")
+    else:
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--start-maximized")
+
+    chrome_prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+    chrome_options.add_experimental_option("prefs", chrome_prefs)
+    return chrome_options
+
+# Request blocking applies to one tab, so every new tab needs it too.
+def block_resources(browser):
+    if not lean_browser:
+        return
+    try:
+        browser.execute_cdp_cmd("Network.enable", {})
+        browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except WebDriverException as e:
+        logger.info(f"Could not enable request blocking: {e.msg}")
+
+# ---------------------------------------------------------------------------
+# Initialize WebDriver. Each session downloads into its own directory so that
+# parallel workers never see each other's files. The chromedriver binary is
+# resolved by webdriver-manager once and its path is cached on disk
+# (GMS_CACHE_DIR, default ~/.cache/gms-pgb), so later runs start without a
+# network round trip; a cached driver that no longer matches the installed
+# Chrome is resolved again.
+driver = None
+wait = None
+driver_download_dir = base_download_dir
+chromedriver_path = None
+cache_dir = os.environ.get("GMS_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gms-pgb")
+chromedriver_cache = os.path.join(cache_dir, "chromedriver.json")
+
+def cached_chromedriver():
+    try:
+        with open(chromedriver_cache, encoding="utf-8") as f:
+            path = json.load(f)["path"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return path if os.path.isfile(path) and os.access(path, os.X_OK) else None
+
+def resolve_chromedriver():
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    path = ChromeDriverManager().install()
+    os.makedirs(cache_dir, exist_ok=True)
+    partial_path = chromedriver_cache + ".part"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        json.dump({"path": path, "resolved_at": datetime.now().isoformat(timespec="seconds")}, f)
+    os.replace(partial_path, chromedriver_cache)
+    logger.info(f"Resolved chromedriver: {path}")
+    return path
+
+def launch_browser(download_dir):
+    global chromedriver_path
+    resolved = False
+    if chromedriver_path is None:
+        chromedriver_path = cached_chromedriver()
+    if chromedriver_path is None:
+        chromedriver_path, resolved = resolve_chromedriver(), True
+    try:
+        browser = webdriver.Chrome(service=Service(chromedriver_path), options=build_chrome_options(download_dir))
+    except SessionNotCreatedException as e:
+        if resolved:
+            raise
+        logger.info(f"Cached chromedriver could not start a session ({e.msg}); resolving it again.")
+        chromedriver_path = resolve_chromedriver()
+        browser = webdriver.Chrome(service=Service(chromedriver_path), options=build_chrome_options(download_dir))
+    block_resources(browser)
+    return browser
+
+def init_driver(download_dir=None):
+    global driver, wait, driver_download_dir
+    if download_dir is not None:
+        driver_download_dir = download_dir
+    driver = launch_browser(driver_download_dir)
+    wait = WebDriverWait(driver, 30)
+
+# ---------------------------------------------------------------------------
+# Event-driven waits. Each named condition is polled every poll_interval
+# seconds and returns the moment it holds, instead of sleeping a fixed time.
+# Every wait records how long it actually took in wait_timings.
+wait_timings = []
+
+# Widget and listbox element ids of the two Kendo dropdowns, by dropdown index.
+DROPDOWN_WIDGET_IDS = {1: "NetworkCode", 2: "MeasurePointDropDownList"}
+DROPDOWN_LISTBOX_IDS = {1: "NetworkCode_listbox", 2: "MeasurePointDropDownList_listbox"}
+
+def listbox_opened(listbox_id):
+    def condition(d):
+        return d.execute_script(
+            "var ul = document.getElementById(arguments[0]);"
+            "return !!ul && ul.getAttribute('aria-hidden') !== 'true' && ul.offsetParent !== null;",
+            listbox_id)
+    return condition
+
+def option_list_populated(listbox_id):
+    def condition(d):
+        return d.execute_script(
+            "var ul = document.getElementById(arguments[0]);"
+            "if (!ul) return 0;"
+            "var items = ul.querySelectorAll('li');"
+            "for (var i = 0; i < items.length; i++) { if (items[i].textContent.trim()) return items.length; }"
+            "return 0;",
+            listbox_id)
+    return condition
+
+def selection_committed(dropdown_index, expected_text):
+    def condition(d):
+        current = d.find_element(By.XPATH, f"(//span[@class='k-input'])[{dropdown_index}]").text.strip()
+        return expected_text.lower() in current.lower()
+    return condition
+
+def dropdown_idle(dropdown_index):
+    # A cascading Kendo dropdown shows a loading icon while it refetches its options.
+    def condition(d):
+        return not d.find_elements(
+            By.XPATH, f"(//span[@class='k-input'])[{dropdown_index}]/following-sibling::span//*[contains(@class, 'k-i-loading')]")
+    return condition
+
+def spinner_gone(d):
+    return not d.find_elements(By.CLASS_NAME, "k-loading-image")
+
+def grid_rendered(d):
+    return spinner_gone(d) and bool(d.find_elements(By.CSS_SELECTOR, ".k-grid .k-grid-content, .k-grid tbody"))
+
+def grid_rows(d):
+    return d.find_elements(By.CSS_SELECTOR, ".k-grid tbody tr")
+
+# Right after a search click the grid of the previous search still counts as
+# rendered. The search has started once the spinner shows or the rows from
+# before the click are gone; a spinner that comes and goes between two polls
+# still leaves new rows behind.
+def search_started(previous_rows):
+    def condition(d):
+        if not spinner_gone(d):
+            return True
+        if previous_rows:
+            return EC.staleness_of(previous_rows[0])(d)
+        return bool(grid_rows(d))
+    return condition
+
+def wait_for(name, condition, timeout=30):
+    start = time.monotonic()
+    try:
+        return WebDriverWait(
+            driver, timeout, poll_frequency=config.poll_interval,
+            ignored_exceptions=(NoSuchElementException, StaleElementReferenceException)
+        ).until(condition)
+    finally:
+        wait_timings.append((name, time.monotonic() - start))
+
+# ---------------------------------------------------------------------------
+# Verification function (case‑insensitive check).
+def verify_selection(dropdown_index, expected_text):
+    try:
+        dropdown = wait.until(EC.visibility_of_element_located(
+            (By.XPATH, f"(//span[@class='k-input'])[{dropdown_index}]")
+        ))
+        current = dropdown.text.strip()
+        # Check if expected text is contained (case-insensitive) in current text.
+        if expected_text.lower() in current.lower():
+            return True
+        else:
+            logger.warning(f"Verification failed: Expected '{expected_text}' in '{current}'")
+            return False
+    except Exception as e:
+        logger.error(f"Error verifying selection: {e}")
+        return False
+
+# ---------------------------------------------------------------------------
+# Select an option through the Kendo widget itself: find it in the client-side
+# data source, set value(), fire 'change' and return the committed text, all
+# in one script call. Returns None when the widget API is not available and
+# '' when no option matches.
+KENDO_SELECT_JS = """
+var widget = window.jQuery && window.jQuery('#' + arguments[0]).data('kendoDropDownList');
+if (!widget) return null;
+var wanted = arguments[1].toLowerCase();
+var textField = widget.options.dataTextField, valueField = widget.options.dataValueField;
+var items = widget.dataSource.data();
+for (var i = 0; i < items.length; i++) {
+    var text = String(textField ? items[i][textField] : items[i]).trim();
+    if (text.toLowerCase().indexOf(wanted) === -1) continue;
+    widget.value(valueField ? items[i][valueField] : text);
+    if (widget.text().trim() !== text) widget.select(i);
+    widget.trigger('change');
+    return widget.text();
+}
+return '';
+"""
+
+def select_via_widget(dropdown_index, option_text):
+    try:
+        committed = driver.execute_script(KENDO_SELECT_JS, DROPDOWN_WIDGET_IDS[dropdown_index], option_text)
+    except WebDriverException as e:
+        logger.info(f"Widget selection unavailable for '{option_text}': {e}")
+        return False
+    if committed is None:
+        return False
+    if option_text.lower() in committed.strip().lower():
+        return True
+    logger.info(f"Widget selection of '{option_text}' committed '{committed}', falling back to clicking.")
+    return False
+
+# ---------------------------------------------------------------------------
+# Revised dropdown selection: uses multiple strategies, starting with the
+# widget API and falling back to clicking the option in the listbox. Clicking
+# is retried as the "selection" retry policy says; a dead browser is not
+# retried but raised, for the caller's crash handling.
+def select_dropdown(dropdown_index, option_text):
+    if select_via_widget(dropdown_index, option_text):
+        logger.info(f"Successfully selected: {option_text}")
+        return True
+    attempts = RETRY_POLICIES["selection"][0]
+    for attempt in range(1, attempts + 1):
+        try:
+            # Click the dropdown to reveal options.
+            dropdown = wait.until(EC.element_to_be_clickable(
+                (By.XPATH, f"(//span[@class='k-input'])[{dropdown_index}]")
+            ))
+            dropdown.click()
+            listbox_id = DROPDOWN_LISTBOX_IDS[dropdown_index]
+            wait_for("listbox opened", listbox_opened(listbox_id), timeout=10)
+            wait_for("option list populated", option_list_populated(listbox_id), timeout=10)
+            # Retrieve all options.
+            options = driver.find_elements(By.XPATH, f"//ul[@id='{listbox_id}']/li")
+            target_option = None
+            for opt in options:
+                txt = opt.text.strip()
+                if option_text.lower() in txt.lower():
+                    target_option = opt
+                    break
+            if not target_option:
+                raise Exception(f"Option '{option_text}' not found in dropdown {dropdown_index}")
+            # Scroll the option into view.
+            driver.execute_script("arguments[0].scrollIntoView(true);", target_option)
+            # Try using ActionChains to click.
+            try:
+                ActionChains(driver).move_to_element(target_option).click(target_option).perform()
+            except Exception as e:
+                logger.info(f"ActionChains click failed for '{option_text}', trying JS click: {e}")
+                driver.execute_script("arguments[0].click();", target_option)
+            try:
+                wait_for("selection committed", selection_committed(dropdown_index, option_text), timeout=10)
+            except TimeoutException:
+                pass
+            if verify_selection(dropdown_index, option_text):
+                logger.info(f"Successfully selected: {option_text}")
+                return True
+        except Exception as e:
+            if not browser_alive():
+                raise
+            logger.info(f"Attempt {attempt}: Failed to select '{option_text}'. Exception: {e}")
+        if attempt < attempts:
+            time.sleep(backoff("selection", attempt))
+    logger.error(f"Failed to select '{option_text}' after {attempts} attempts.")
+    return False
+
+# ---------------------------------------------------------------------------
+# Utility function to set date inputs.
+def set_date_input(date_str, start=True):
+    try:
+        date_input_id = "DataProviderDatePicker" if start else "EndDateDatePicker"
+        date_input = wait.until(EC.visibility_of_element_located((By.ID, date_input_id)))
+        date_input.clear()
+        date_input.send_keys(date_str)
+        logger.info(f"Set {'start' if start else 'end'} date to {date_str}")
+    except Exception as e:
+        logger.error(f"Failed to set {'start' if start else 'end'} date: {e}")
+
+# ---------------------------------------------------------------------------
+# Start the search for the selected network, measurement point and dates.
+# Returns the grid rows from before the click, for search_started.
+def click_search():
+    previous_rows = grid_rows(driver)
+    search_button = wait.until(EC.element_to_be_clickable((By.ID, "search")))
+    search_button.click()
+    return previous_rows
+
+# ---------------------------------------------------------------------------
+# Utility function to click the export button.
+def click_export_button(timeout=30):
+    try:
+        export_button = WebDriverWait(driver, timeout, poll_frequency=config.poll_interval).until(
+            EC.element_to_be_clickable((By.ID, "PGBdailygasmovement-export")))
+        driver.execute_script("arguments[0].click();", export_button)
+        logger.info("Export button clicked.")
+        return True
+    except Exception as e:
+        logger.warning(f"Export button not found or clickable: {e}. Skipping this network.")
+        return False
+
+# ---------------------------------------------------------------------------
+# Wait for the search to start, then for the page loading spinner to
+# disappear.
+def wait_for_loading(timeout=300, network_name="", previous_rows=()):
+    logger.info(f"Waiting for page to load for network '{network_name}'...")
+    deadline = time.monotonic() + timeout
+    try:
+        wait_for("search started", search_started(previous_rows), timeout=timeout)
+        wait_for("spinner gone", spinner_gone, timeout=max(1.0, deadline - time.monotonic()))
+        wait_for("grid rendered", grid_rendered, timeout=10)
+        logger.info("Page loading finished.")
+        return True
+    except TimeoutException:
+        logger.warning(f"Timeout waiting for page to load for network '{network_name}'.")
+        return False
+
+# ---------------------------------------------------------------------------
+# Empty results. Right after the grid has rendered, it is read once: the
+# Kendo data source total when the grid widget is there, otherwise the data
+# rows, the "no records" message and the export button. A search with no rows
+# is only taken as empty when the no-records message or the missing export
+# button confirms it, so rows that have not rendered yet still get exported.
+GRID_STATE_JS = """
+var gridElement = document.querySelector('.k-grid');
+if (!gridElement) return null;
+var grid = window.jQuery && window.jQuery(gridElement).data && window.jQuery(gridElement).data('kendoGrid');
+var total = grid && grid.dataSource && typeof grid.dataSource.total === 'function' ? grid.dataSource.total() : null;
+var rows = 0, trs = gridElement.querySelectorAll('tbody tr');
+for (var i = 0; i < trs.length; i++) {
+    if (!trs[i].classList.contains('k-no-data') && !trs[i].classList.contains('k-grid-norecords')
+            && trs[i].querySelector('td')) rows++;
+}
+var noRecords = gridElement.querySelector('.k-grid-norecords, .k-no-data');
+var button = document.getElementById('PGBdailygasmovement-export');
+return {total: total, rows: rows, no_records: !!noRecords && noRecords.offsetParent !== null,
+        export: !!button && button.offsetParent !== null};
+"""
+
+def search_result_empty():
+    try:
+        state = driver.execute_script(GRID_STATE_JS)
+    except WebDriverException as e:
+        logger.info(f"Could not read the results grid: {e.msg}")
+        return False
+    if not state:
+        return False
+    if state.get("total") is not None:
+        return state["total"] == 0
+    return state["rows"] == 0 and (state["no_records"] or not state["export"])
+
+# Wait for the download started by the export click the watcher was armed for.
+# A click that starts no download at all is given up after
+# DOWNLOAD_START_TIMEOUT seconds instead of the full timeout.
+def wait_for_download(watcher, timeout=120):
+    start = time.monotonic()
+    downloaded_file = watcher.wait(timeout, start_timeout=min(timeout, DOWNLOAD_START_TIMEOUT))
+    wait_timings.append(("download completed", time.monotonic() - start))
+    if downloaded_file:
+        logger.info(f"Detected downloaded file: {downloaded_file}")
+        return downloaded_file
+    if watcher.started:
+        logger.info("No downloaded file detected.")
+    else:
+        logger.info(f"No download started within {time.monotonic() - start:.0f}s of the export click.")
+    return None
+
+# ---------------------------------------------------------------------------
+# Retrieve measurement point options for the currently selected network.
+def get_measurement_points():
+    try:
+        measurement_point_dropdown = wait.until(EC.element_to_be_clickable((By.XPATH, "(//span[@class='k-input'])[2]")))
+        measurement_point_dropdown.click()
+        wait_for("listbox opened", listbox_opened(DROPDOWN_LISTBOX_IDS[2]), timeout=10)
+        wait_for("option list populated", option_list_populated(DROPDOWN_LISTBOX_IDS[2]), timeout=10)
+        measurement_point_options = driver.find_elements(By.XPATH, "//ul[contains(@id, 'MeasurePointDropDownList_listbox')]/li")
+        measurement_point_names = [option.text.strip() for option in measurement_point_options if option.text.strip()]
+        measurement_point_dropdown.click()  # collapse dropdown
+        return measurement_point_names
+    except Exception as e:
+        logger.error(f"Error retrieving measurement points: {e}")
+        return []
+
+# ---------------------------------------------------------------------------
+# Login and navigate to "PGB Daily Gas Movement".
+def login_and_navigate():
+    with timed_step("login"):
+        navigate_after_login()
+    log_session_resources("after login")
+
+def navigate_after_login():
+    try:
+        driver.get(gms_home_url)
+        website_username = os.environ.get("WEBSITE_USERNAME", "pltadmin")
+        website_password = os.environ.get("WEBSITE_PASSWORD", "pltadmin@2020")
+        username_field = wait.until(EC.visibility_of_element_located((By.ID, "UserCtrl")))
+        password_field = wait.until(EC.visibility_of_element_located((By.ID, "PwdCtrl")))
+        username_field.send_keys(website_username)
+        password_field.send_keys(website_password)
+        login_button = wait.until(EC.element_to_be_clickable((By.NAME, "btnLogin")))
+        login_button.click()
+        # Navigate via Certification tab to PGB Daily Gas Movement.
+        certification_tab = wait_for("certification menu", EC.presence_of_element_located((By.LINK_TEXT, "Certification")))
+        ActionChains(driver).move_to_element(certification_tab).click().perform()
+        pgb_daily_gas_movement = wait_for("menu opened", EC.element_to_be_clickable((By.LINK_TEXT, "PGB Daily Gas Movement")))
+        pgb_daily_gas_movement.click()
+        wait_for("page loaded", EC.element_to_be_clickable((By.XPATH, "(//span[@class='k-input'])[1]")))
+        logger.info("Navigated to PGB Daily Gas Movement")
+    except Exception as e:
+        logger.error(f"Login and navigation failed: {e}")
+        raise
+
+# ---------------------------------------------------------------------------
+# Fast recovery. Once logged in, the session cookies and the PGB Daily Gas
+# Movement URL are saved and a standby browser is started in the background,
+# parked on the portal so the cookies can be set on it. When the session dies,
+# the standby takes over, gets the cookies and opens the page directly; only
+# if that fails does it log in again. Set GMS_STANDBY=0 (--no-standby) to skip
+# the standby browser.
+standby_enabled = os.environ.get("GMS_STANDBY", "1") != "0"
+standby_driver = None
+standby_thread = None
+session_cookies = []
+pgb_page_url = None
+
+def save_session():
+    global session_cookies, pgb_page_url
+    session_cookies = driver.get_cookies()
+    pgb_page_url = driver.current_url
+
+def warm_standby():
+    global standby_thread
+    if not standby_enabled or standby_thread is not None:
+        return
+
+    def launch():
+        global standby_driver
+        try:
+            browser = launch_browser(driver_download_dir)
+            browser.get(gms_home_url)
+            standby_driver = browser
+        except Exception as e:
+            logger.info(f"Could not start the standby browser: {e}")
+
+    standby_thread = threading.Thread(target=launch, daemon=True)
+    standby_thread.start()
+
+def prepare_recovery():
+    save_session()
+    warm_standby()
+
+def take_standby():
+    global standby_driver, standby_thread
+    if standby_thread is None:
+        return None
+    standby_thread.join(timeout=60)
+    browser, standby_driver, standby_thread = standby_driver, None, None
+    if browser is None:
+        return None
+    try:
+        browser.current_url  # still alive?
+        return browser
+    except WebDriverException:
+        return None
+
+def shutdown_standby():
+    browser = take_standby()
+    if browser is not None:
+        try:
+            browser.quit()
+        except Exception:
+            pass
+
+def restore_session():
+    for cookie in session_cookies:
+        driver.add_cookie({key: value for key, value in cookie.items() if key not in ("domain", "sameSite")})
+    driver.get(pgb_page_url)
+    wait_for("page loaded", EC.element_to_be_clickable((By.XPATH, "(//span[@class='k-input'])[1]")), timeout=15)
+
+# Extra tabs of the logged-in session, each on its own PGB Daily Gas Movement
+# page. The cookies are shared, so a tab needs no login of its own.
+def open_tab():
+    driver.switch_to.new_window("tab")
+    block_resources(driver)
+    reload_tab()
+    return driver.current_window_handle
+
+def reload_tab():
+    driver.get(pgb_page_url)
+    wait_for("page loaded", EC.element_to_be_clickable((By.XPATH, "(//span[@class='k-input'])[1]")))
+
+def browser_alive():
+    try:
+        driver.window_handles
+        return True
+    except WebDriverException:
+        return False
+
+# ---------------------------------------------------------------------------
+# Session footprint: resident memory of the browser (chromedriver and every
+# Chrome process under it, read from /proc, so Linux only) and the load time
+# and transferred bytes of the current page. Logged after login and when the
+# session ends, and collected in session_stats for the run summary.
+session_stats = []
+PAGE_LOAD_JS = (
+    "var nav = performance.getEntriesByType('navigation')[0];"
+    "var resources = performance.getEntriesByType('resource');"
+    "var bytes = nav ? nav.transferSize || 0 : 0;"
+    "for (var i = 0; i < resources.length; i++) bytes += resources[i].transferSize || 0;"
+    "return {load_ms: nav ? Math.round(nav.loadEventEnd - nav.startTime) : null,"
+    " resources: resources.length, bytes: bytes};"
+)
+
+def process_children():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    return children
+
+def browser_rss(browser):
+    try:
+        pending = [browser.service.process.pid]
+        children = process_children()
+    except (AttributeError, OSError):
+        return None
+    total = 0
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+                total += next((int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:")), 0)
+        except OSError:
+            pass
+    return total
+
+def log_session_resources(label):
+    if driver is None:
+        return
+    stats = {"label": label, "pid": os.getpid(), "rss_bytes": browser_rss(driver)}
+    try:
+        stats.update(driver.execute_script(PAGE_LOAD_JS) or {})
+    except WebDriverException:
+        pass
+    session_stats.append(stats)
+    parts = []
+    if stats["rss_bytes"] is not None:
+        parts.append(f"browser RSS {stats['rss_bytes'] / 2 ** 20:.0f} MiB")
+    if stats.get("load_ms") is not None:
+        parts.append(f"page load {stats['load_ms']} ms, {stats['resources']} resources, "
+                     f"{stats['bytes'] / 1024:.0f} KiB transferred")
+    if parts:
+        logger.info(f"Browser session {label}: " + ", ".join(parts))
+
+def quit_driver():
+    log_session_resources("at exit")
+    driver.quit()
+
+# ---------------------------------------------------------------------------
+# Reinitialize driver if needed, re-applying the network that was selected.
+# With a reason, this is a planned restart asked for by the watchdog and is
+# timed as a "recycle" step instead of a "recovery".
+def reinitialize_driver(network=None, reason=None):
+    global driver, wait
+    if reason:
+        logger.info(f"Recycling the browser ({reason})...")
+    else:
+        logger.info("Browser closed unexpectedly. Reinitializing driver...")
+    start = time.monotonic()
+    with timed_step("recycle" if reason else "recovery", network or "") as span:
+        try:
+            if reason:
+                quit_driver()
+            else:
+                driver.quit()
+        except Exception:
+            pass
+        standby = take_standby()
+        if standby is not None:
+            driver = standby
+            wait = WebDriverWait(driver, 30)
+        else:
+            init_driver()
+        span["mode"] = "relogin"
+        try:
+            if standby is not None and session_cookies and pgb_page_url:
+                try:
+                    restore_session()
+                    span["mode"] = "restored"
+                except Exception as e:
+                    logger.info(f"Restoring the saved session failed ({e}); logging in again.")
+            if span["mode"] == "relogin":
+                login_and_navigate()
+            save_session()
+            if network:
+                select_dropdown(1, network)
+                wait_for("measurement points reloaded", dropdown_idle(2))
+            logger.info(f"Driver reinitialized and navigated back successfully ({span['mode']}, {time.monotonic() - start:.1f}s)")
+        except Exception as e:
+            span["status"] = "error"
+            logger.error(f"Failed to reinitialize driver: {e}")
+    warm_standby()
+
+# ---------------------------------------------------------------------------
+# Retrieve network names from the network dropdown.
+def get_network_names():
+    network_dropdown = wait.until(EC.element_to_be_clickable((By.XPATH, "(//span[@class='k-input'])[1]")))
+    network_dropdown.click()
+    wait_for("listbox opened", listbox_opened(DROPDOWN_LISTBOX_IDS[1]), timeout=10)
+    wait_for("option list populated", option_list_populated(DROPDOWN_LISTBOX_IDS[1]), timeout=10)
+    network_options = driver.find_elements(By.XPATH, "//ul[@id='NetworkCode_listbox']/li")
+    network_names = [option.text for option in network_options]
+    network_dropdown.click()  # collapse dropdown
+    return network_names
+
+# Map option text to option value for a Kendo dropdown, so the HTTP client
+# can send the same codes the form would.
+WIDGET_VALUES_JS = """
+var widget = window.jQuery && window.jQuery('#' + arguments[0]).data('kendoDropDownList');
+if (!widget) return {};
+var textField = widget.options.dataTextField, valueField = widget.options.dataValueField;
+var items = widget.dataSource.data(), values = {};
+for (var i = 0; i < items.length; i++) {
+    var text = textField ? items[i][textField] : items[i];
+    var value = valueField ? items[i][valueField] : items[i];
+    values[String(text).trim()] = String(value);
+}
+return values;
+"""
+
+def read_widget_values(widget_id):
+    try:
+        return driver.execute_script(WIDGET_VALUES_JS, widget_id) or {}
+    except Exception as e:
+        logger.info(f"Could not read option values for '{widget_id}': {e}")
+        return {}
+
+# ---------------------------------------------------------------------------
+# Catalog discovery: walk every network's dropdown and read the measurement
+# points and option values. Loading and saving the catalog is in catalog.py.
+def discover_catalog(network_names):
+    catalog = {
+        "portal": gms_base_url,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "network_values": read_widget_values("NetworkCode"),
+        "networks": {},
+    }
+    for network in network_names:
+        select_dropdown(1, network)
+        wait_for("measurement points reloaded", dropdown_idle(2))
+        measurement_point_names = get_measurement_points()
+        logger.info(f"For network '{network}', found {len(measurement_point_names)} measurement points: {measurement_point_names}")
+        catalog["networks"][network] = {
+            "measurement_points": measurement_point_names,
+            "values": read_widget_values("MeasurePointDropDownList"),
+        }
+    return catalog
+
+# Re-read one network's points in the current session. The new list travels
+# back with the results and is merged into the catalog by the main process.
+def rediscover_network(network, results):
+    select_dropdown(1, network)
+    wait_for("measurement points reloaded", dropdown_idle(2))
+    measurement_point_names = get_measurement_points()
+    logger.info(f"Re-discovered {len(measurement_point_names)} measurement points for network '{network}': {measurement_point_names}")
+    results["rediscovered"].append((network, measurement_point_names, read_widget_values("MeasurePointDropDownList")))
+    return measurement_point_names
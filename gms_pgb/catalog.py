@@ -0,0 +1,56 @@
+import os
+import json
+from datetime import datetime, timedelta
+
+from .config import state_dir, gms_base_url, logger
+
+# ---------------------------------------------------------------------------
+# Measurement-point catalog. Discovering every network's points costs a
+# dropdown walk per network, but the mapping almost never changes, so it is
+# cached in the state directory and reused until it is older than the TTL
+# (or --refresh-catalog is given). The catalog also keeps the dropdown option
+# values used by --http.
+catalog_path = os.path.join(state_dir, "catalog.json")
+
+def load_catalog(ttl_hours):
+    try:
+        with open(catalog_path, encoding="utf-8") as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return None
+    age = datetime.now() - datetime.fromisoformat(catalog["updated_at"])
+    if catalog.get("portal") != gms_base_url or age > timedelta(hours=ttl_hours):
+        logger.info(f"Measurement-point catalog is stale (updated {catalog['updated_at']}).")
+        return None
+    logger.info(f"Using measurement-point catalog from {catalog['updated_at']} ({len(catalog['networks'])} networks).")
+    return catalog
+
+def save_catalog(catalog):
+    os.makedirs(state_dir, exist_ok=True)
+    partial_path = catalog_path + ".part"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, indent=2, ensure_ascii=False)
+    os.replace(partial_path, catalog_path)
+
+# Discovery itself needs the browser and lives in browser.py; rediscoveries
+# made by workers come back with the results and are merged here.
+def apply_rediscoveries(catalog, rediscovered):
+    for network, measurement_point_names, values in rediscovered:
+        catalog["networks"][network] = {"measurement_points": measurement_point_names, "values": values}
+
+def catalog_work_items(catalog, results):
+    work_items = []
+    for network, entry in catalog["networks"].items():
+        if not entry["measurement_points"]:
+            logger.error(f"Measurement points not found for network '{network}'. Skipping...")
+            results["skipped"].append(network)
+            continue
+        work_items.extend((network, measurement_point) for measurement_point in entry["measurement_points"])
+    return work_items
+
+def catalog_option_values(catalog):
+    option_values = dict(catalog.get("network_values", {}))
+    for network, entry in catalog["networks"].items():
+        for text, value in entry.get("values", {}).items():
+            option_values[(network, text)] = value
+    return option_values
@@ -0,0 +1,311 @@
+import os
+import csv
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from . import config
+from .config import base_local_dir, logger, setup_logging
+
+# ---------------------------------------------------------------------------
+# Command line: gms-pgb download | catalog | zip | consolidate | ingest |
+# query. Only download and catalog --refresh need the browser, so Selenium is
+# imported by those commands alone; the others run without it.
+def add_catalog_arguments(parser):
+    parser.add_argument("--catalog-ttl", type=float, default=168,
+                        help="Hours a cached measurement-point catalog stays valid (default: 168).")
+    parser.add_argument("--refresh-catalog", action="store_true",
+                        help="Re-discover every network's measurement points instead of using the cached catalog.")
+
+def add_month_argument(parser):
+    parser.add_argument("--month", help="Month to work on as YYYY-MM (default: the current month).")
+
+def add_zip_arguments(parser):
+    parser.add_argument("--zip-threads", type=int, default=None,
+                        help="Threads that read and compress new or changed ZIP entries (default: up to 8).")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gms-pgb", description="Download PGB Daily Gas Movement files from the GMS portal.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    download = commands.add_parser("download", help="Download this month's workbooks (or backfill a date range) and build the ZIP artifacts.")
+    download.add_argument("--workers", type=int, default=1,
+                          help="Number of parallel Chrome sessions to shard measurement points across (default: 1).")
+    download.add_argument("--tabs", type=int, default=1,
+                          help="Tabs per Chrome session; searches of different tabs overlap while exports run one at a time (default: 1).")
+    download.add_argument("--http", action="store_true",
+                          help="Log in with the browser, then fetch exports directly over HTTP; failed items fall back to the browser.")
+    download.add_argument("--http-concurrency", type=int, default=4,
+                          help="Number of concurrent HTTP export requests in --http mode (default: 4).")
+    download.add_argument("--adaptive", action="store_true",
+                          help="Adapt the number of in-flight tabs or HTTP requests to the portal's latency; --tabs and --http-concurrency become the ceiling.")
+    download.add_argument("--min-concurrency", type=int, default=1,
+                          help="Lowest in-flight limit the adaptive controller backs off to (default: 1).")
+    download.add_argument("--latency-factor", type=float, default=1.5,
+                          help="Back off when smoothed latency exceeds the best seen by this factor (default: 1.5).")
+    download.add_argument("--poll-interval", type=float, default=config.poll_interval,
+                          help="Seconds between checks of a wait condition (default: GMS_POLL_INTERVAL or 0.2).")
+    download.add_argument("--from", dest="from_date", metavar="DATE",
+                          help="Backfill from this day (YYYY-MM-DD or DD/MM/YYYY) instead of fetching the current month.")
+    download.add_argument("--to", dest="to_date", metavar="DATE",
+                          help="Last day of the backfill (default: yesterday).")
+    download.add_argument("--window-days", type=int, default=31,
+                          help="Longest date window one backfill search covers; windows never cross a month (default: 31).")
+    download.add_argument("--full-month", action="store_true",
+                          help="Re-pull every measurement point from the 1st of the month instead of only the days since the last run.")
+    add_catalog_arguments(download)
+    download.add_argument("--consolidate", action="store_true",
+                          help="After downloading, stream the month's workbooks into the partitioned dataset under downloads/dataset.")
+    download.add_argument("--no-standby", action="store_true",
+                          help="Do not keep a pre-warmed standby browser for crash recovery.")
+    download.add_argument("--full-browser", action="store_true",
+                          help="Load images, fonts and media and keep Chrome's default extras (no lean profile).")
+    download.add_argument("--recycle-after", type=int, metavar="ITEMS",
+                          help="Restart each browser after this many items (default: GMS_RECYCLE_EXPORTS or 200; 0 = never).")
+    download.add_argument("--recycle-rss", type=int, metavar="MIB",
+                          help="Restart a browser once its RSS exceeds this many MiB (default: GMS_RECYCLE_RSS_MIB or 1536; 0 = never).")
+    download.add_argument("--item-budget", type=float, metavar="SECONDS",
+                          help="Give up on an item after this many seconds of waits and retries (default: GMS_ITEM_BUDGET or 600; 0 = no limit).")
+    download.add_argument("--resume", action="store_true",
+                          help="Skip items the manifest records as downloaded for this date range; retry failed or missing ones.")
+    add_zip_arguments(download)
+
+    catalog = commands.add_parser("catalog", help="Show the cached measurement-point catalog, discovering it when needed.")
+    add_catalog_arguments(catalog)
+
+    zip_command = commands.add_parser("zip", help="Build the ZIP artifact of a month's downloads.")
+    add_month_argument(zip_command)
+    add_zip_arguments(zip_command)
+
+    consolidate = commands.add_parser("consolidate", help="Stream a month's workbooks into the partitioned dataset.")
+    add_month_argument(consolidate)
+
+    ingest = commands.add_parser("ingest", help="Load downloaded workbooks into the history store (downloads/history.sqlite).")
+    ingest.add_argument("--month", help="Only this month, as YYYY-MM (default: every month folder).")
+
+    query = commands.add_parser("query", help="Look up days or aggregates in the history store; prints CSV.")
+    query.add_argument("--mp", dest="measurement_point", help="Measurement point name.")
+    query.add_argument("--network", help="Network name.")
+    query.add_argument("--from", dest="from_date", metavar="DATE", help="First gas day (YYYY-MM-DD or DD/MM/YYYY).")
+    query.add_argument("--to", dest="to_date", metavar="DATE", help="Last gas day (default: no limit).")
+    query.add_argument("--days", type=int, help="The last N gas days up to today, instead of --from/--to.")
+    query.add_argument("--columns", help="Comma-separated columns to print (default: all).")
+    query.add_argument("--agg", choices=("sum", "avg", "min", "max", "count"),
+                       help="Aggregate --column over the matching days instead of listing them.")
+    query.add_argument("--column", help="Column to aggregate (see --list-columns).")
+    query.add_argument("--by", choices=("measurement_point", "network", "month", "day"), help="Group the aggregate.")
+    query.add_argument("--list-columns", action="store_true", help="List the columns in the store and exit.")
+    return parser
+
+def parse_day(parser, option, value):
+    for date_format in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    parser.error(f"{option} must be YYYY-MM-DD or DD/MM/YYYY, got '{value}'")
+
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "download":
+        if args.poll_interval <= 0:
+            parser.error("--poll-interval must be positive")
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        if args.tabs < 1:
+            parser.error("--tabs must be at least 1")
+        if args.http_concurrency < 1:
+            parser.error("--http-concurrency must be at least 1")
+        if args.min_concurrency < 1:
+            parser.error("--min-concurrency must be at least 1")
+        if args.latency_factor <= 1:
+            parser.error("--latency-factor must be greater than 1")
+        if (args.recycle_after or 0) < 0 or (args.recycle_rss or 0) < 0:
+            parser.error("--recycle-after and --recycle-rss cannot be negative")
+        if args.http and args.workers > 1:
+            parser.error("--http and --workers cannot be combined")
+        if args.to_date and not args.from_date:
+            parser.error("--to needs --from")
+        if args.from_date:
+            if args.http:
+                parser.error("--from cannot be combined with --http")
+            if args.window_days < 1:
+                parser.error("--window-days must be at least 1")
+            today = datetime.now().date()
+            args.from_date = parse_day(parser, "--from", args.from_date)
+            args.to_date = parse_day(parser, "--to", args.to_date) if args.to_date else today - timedelta(days=1)
+            if args.to_date > today:
+                parser.error("--to cannot be in the future")
+            if args.from_date > args.to_date:
+                parser.error("--from must not be after --to")
+    if args.command == "query":
+        if args.days is not None:
+            if args.from_date or args.to_date:
+                parser.error("--days cannot be combined with --from/--to")
+            if args.days < 1:
+                parser.error("--days must be at least 1")
+            today = datetime.now().date()
+            args.from_date, args.to_date = today - timedelta(days=args.days - 1), today
+        else:
+            args.from_date = parse_day(parser, "--from", args.from_date) if args.from_date else None
+            args.to_date = parse_day(parser, "--to", args.to_date) if args.to_date else None
+        if args.agg and not args.column:
+            parser.error("--agg needs --column")
+    if getattr(args, "zip_threads", None) is not None and args.zip_threads < 1:
+        parser.error("--zip-threads must be at least 1")
+    if getattr(args, "month", None):
+        try:
+            config.month_folder(args.month)
+        except ValueError:
+            parser.error(f"--month must be YYYY-MM, got '{args.month}'")
+    return args
+
+# ---------------------------------------------------------------------------
+def zip_month(month_dir, threads=None):
+    from .artifact import compress_downloads_dir
+
+    zip_filename = os.path.join(base_local_dir, f"{os.path.basename(month_dir)}.zip")
+    compress_downloads_dir(month_dir, zip_filename, threads)
+    logger.info("Artifact is ready. Use GitHub Actions 'upload-artifact' step to save the ZIP file.")
+
+def download_command(args):
+    config.poll_interval = args.poll_interval
+    # Spawned workers re-import the package and read these settings from the environment.
+    os.environ["GMS_POLL_INTERVAL"] = str(config.poll_interval)
+    if args.no_standby:
+        os.environ["GMS_STANDBY"] = "0"
+    if args.full_browser:
+        os.environ["GMS_LEAN_BROWSER"] = "0"
+    if args.recycle_after is not None:
+        os.environ["GMS_RECYCLE_EXPORTS"] = str(args.recycle_after)
+    if args.recycle_rss is not None:
+        os.environ["GMS_RECYCLE_RSS_MIB"] = str(args.recycle_rss)
+    if args.item_budget is not None:
+        os.environ["GMS_ITEM_BUDGET"] = str(args.item_budget)
+    setup_logging()
+    logger.info("Starting script...")
+
+    if args.from_date:
+        from .backfill import backfill_windows, backfill_month_folders, run_backfill
+
+        windows = backfill_windows(args.from_date, args.to_date, args.window_days)
+        run_backfill(args, windows)
+        month_dirs = backfill_month_folders(windows)
+    else:
+        from .runner import run_download
+
+        start_date_str, end_date_str = config.compute_date_range()
+        logger.info(f"Dynamic date range - Start: {start_date_str}, End: {end_date_str}")
+        run_download(args, start_date_str, end_date_str)
+        month_dirs = [config.base_download_dir]
+
+    for month_dir in month_dirs:
+        if args.consolidate:
+            from .consolidate import consolidate_month
+
+            consolidate_month(month_dir)
+        zip_month(month_dir, args.zip_threads)
+
+    from .history import ingest_months
+
+    ingest_months(month_dirs)
+
+def catalog_command(args):
+    from .catalog import load_catalog, save_catalog
+
+    setup_logging(filemode='a')
+    catalog = None if args.refresh_catalog else load_catalog(args.catalog_ttl)
+    if catalog is None:
+        from . import browser
+
+        browser.init_driver(config.base_download_dir)
+        try:
+            browser.login_and_navigate()
+            catalog = browser.discover_catalog(browser.get_network_names())
+        finally:
+            browser.driver.quit()
+        save_catalog(catalog)
+    print(f"Catalog of {catalog['portal']}, updated {catalog['updated_at']}:")
+    for network, entry in catalog["networks"].items():
+        print(f"  {network}: {len(entry['measurement_points'])} measurement points")
+
+def existing_month_folder(month):
+    month_dir = config.month_folder(month)
+    if not os.path.isdir(month_dir):
+        logger.error(f"No downloads for {month or 'this month'}: '{month_dir}' does not exist.")
+        return None
+    return month_dir
+
+def zip_command(args):
+    setup_logging(filemode='a')
+    month_dir = existing_month_folder(args.month)
+    if month_dir is None:
+        return 1
+    zip_month(month_dir, args.zip_threads)
+
+def consolidate_command(args):
+    from .consolidate import consolidate_month
+
+    setup_logging(filemode='a')
+    month_dir = existing_month_folder(args.month)
+    if month_dir is None:
+        return 1
+    consolidate_month(month_dir)
+
+def ingest_command(args):
+    from .history import ingest_months
+
+    setup_logging(filemode='a')
+    if args.month:
+        month_dir = existing_month_folder(args.month)
+        if month_dir is None:
+            return 1
+        ingest_months([month_dir])
+    else:
+        ingest_months()
+
+def query_command(args):
+    from .history import history_path, query_days, query_aggregate, query_columns
+
+    if not os.path.exists(history_path):
+        print(f"No history store at '{history_path}'; run 'gms-pgb ingest' first.", file=sys.stderr)
+        return 1
+    start = time.monotonic()
+    writer = csv.writer(sys.stdout)
+    if args.list_columns:
+        writer.writerow(["column", "days"])
+        writer.writerows(query_columns(args.measurement_point))
+    else:
+        start_day = args.from_date.isoformat() if args.from_date else None
+        end_day = args.to_date.isoformat() if args.to_date else None
+        if args.agg:
+            writer.writerow([args.by or "all", f"{args.agg}_{args.column}", "days"])
+            writer.writerows(query_aggregate(args.column, args.agg, args.by, args.measurement_point, args.network,
+                                             start_day, end_day))
+        else:
+            columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+            records = query_days(args.measurement_point, args.network, start_day, end_day, columns)
+            fields = list(dict.fromkeys(key for record in records for key in record))
+            writer = csv.DictWriter(sys.stdout, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+    print(f"Query took {(time.monotonic() - start) * 1000:.1f} ms", file=sys.stderr)
+
+COMMANDS = {
+    "download": download_command,
+    "catalog": catalog_command,
+    "zip": zip_command,
+    "consolidate": consolidate_command,
+    "ingest": ingest_command,
+    "query": query_command,
+}
+
+def main(argv=None):
+    config.apply_timezone()
+    args = parse_args(argv)
+    return COMMANDS[args.command](args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import time
+
+from .config import logger
+
+# ---------------------------------------------------------------------------
+# Adaptive concurrency (--adaptive). An AIMD controller sets how many searches
+# or exports may be in flight against the portal at once: while the smoothed
+# latency of each kind of request stays within latency_factor of the best
+# seen so far, the limit grows by one per limit's worth of successes
+# (additive increase); when latency climbs, a search times out or an export
+# goes missing, the limit is cut in half (multiplicative decrease). After a
+# decrease, requests that were already in flight no longer count, so a single
+# slow burst only halves the limit once. Rises of less than MIN_LATENCY_RISE
+# seconds are noise, not load. The baseline drifts up slowly so that a portal
+# that has become slower for good is eventually accepted as the new normal.
+EWMA_ALPHA = 0.3
+BASELINE_DRIFT = 0.02
+MIN_LATENCY_RISE = 0.5
+
+class AimdController:
+    def __init__(self, name, minimum, maximum, latency_factor=1.5, decrease=0.5, min_rise=MIN_LATENCY_RISE):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.min_rise = min_rise
+        self.limit = float(minimum)
+        self.smoothed = {}
+        self.baseline = {}
+        self.backed_off_at = float("-inf")
+        self.peak = minimum
+        self.decreases = 0
+        logger.info(f"Adaptive concurrency for {name}: starting at {minimum}, between {minimum} and {maximum}.")
+
+    @property
+    def allowed(self):
+        return int(self.limit)
+
+    # One finished request: how long it took and, if it went wrong, how.
+    def observe(self, kind, seconds, failure=None):
+        if time.monotonic() - seconds < self.backed_off_at:
+            return
+        if failure:
+            self.back_off(f"{kind} {failure}")
+            return
+        smoothed = seconds if kind not in self.smoothed else (
+            EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.smoothed[kind])
+        self.smoothed[kind] = smoothed
+        baseline = self.baseline[kind] = min(self.baseline.get(kind, smoothed) * (1 + BASELINE_DRIFT), smoothed)
+        if smoothed > baseline * self.latency_factor and smoothed - baseline > self.min_rise:
+            self.back_off(f"{kind} latency {smoothed:.1f}s against a baseline of {baseline:.1f}s")
+        else:
+            self.set_limit(self.limit + 1 / max(self.limit, 1), None)
+
+    def back_off(self, reason):
+        self.backed_off_at = time.monotonic()
+        self.decreases += 1
+        self.set_limit(self.limit * self.decrease, reason)
+        # Latency measured at the old limit no longer describes the new one.
+        self.smoothed.clear()
+
+    def set_limit(self, limit, reason):
+        before = self.allowed
+        self.limit = max(float(self.minimum), min(float(self.maximum), limit))
+        if self.allowed != before:
+            self.peak = max(self.peak, self.allowed)
+            logger.info(f"Adaptive concurrency for {self.name}: {before} -> {self.allowed}"
+                        + (f" (backing off: {reason})" if reason else " (latency steady)"))
+
+    def log_summary(self):
+        logger.info(f"Adaptive concurrency for {self.name}: finished at {self.allowed}, peaked at {self.peak}, "
+                    f"backed off {self.decreases} times.")
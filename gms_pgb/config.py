@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo  # For Python 3.9+ time zone support
+
+# ---------------------------------------------------------------------------
+# Gas days, month folders and log timestamps follow Malaysia time. Names
+# computed at import use the zone explicitly; the CLI calls apply_timezone()
+# at startup for the rest of the run (spawned workers inherit TZ). Importing
+# the package leaves the process time zone alone.
+malaysia_tz = ZoneInfo("Asia/Kuala_Lumpur")
+
+# Set system time zone to Asia/Kuala_Lumpur (for Linux/GitHub Actions)
+def apply_timezone():
+    os.environ['TZ'] = 'Asia/Kuala_Lumpur'
+    time.tzset()
+
+# ---------------------------------------------------------------------------
+# Configure directories for downloads and logs
+base_local_dir = os.path.join(os.getcwd(), "downloads")
+current_month_folder = datetime.now(malaysia_tz).strftime("%B %Y")
+base_download_dir = os.path.join(base_local_dir, current_month_folder)
+
+# Run state (manifest, catalog) lives next to the month folders.
+state_dir = os.path.join(base_local_dir, ".state")
+
+# Portal location. Point GMS_BASE_URL at a local stand-in of the GMS page to
+# run the whole flow offline.
+gms_base_url = os.environ.get("GMS_BASE_URL", "https://gms.gasmalaysia.com").rstrip("/")
+gms_home_url = f"{gms_base_url}/pltgtm/cmd.openseal?openSEAL_ck=ViewHome"
+
+# Seconds between checks of a wait condition. Spawned workers re-import the
+# package and read it from the environment.
+poll_interval = float(os.environ.get("GMS_POLL_INTERVAL", "0.2"))
+
+# A number from the environment, or the default when it is unset or invalid.
+def env_number(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logging.getLogger().warning(f"Ignoring {name}={os.environ[name]!r}; using {default}.")
+        return float(default)
+
+# Setup logging: logs will be written to a file in the download directory.
+log_filename = os.path.join(
+    base_download_dir,
+    f"Tracking Networks Downloaded and Skipped [{datetime.now(malaysia_tz).strftime('%Y-%m-%d')}].txt"
+)
+logger = logging.getLogger()
+
+def setup_logging(filemode='w', log_format='%(asctime)s - %(levelname)s - %(message)s'):
+    os.makedirs(base_download_dir, exist_ok=True)
+    if filemode == 'w':
+        # Truncate once, then append like the worker processes do, so no
+        # process writes over another's lines.
+        open(log_filename, 'w').close()
+    logging.basicConfig(
+        level=logging.INFO,
+        format=log_format,
+        filename=log_filename,
+        filemode='a'
+    )
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+    console_formatter = logging.Formatter(log_format)
+    console_handler.setFormatter(console_formatter)
+    logger.addHandler(console_handler)
+
+# Folder of a month given as YYYY-MM (the current month when None).
+def month_folder(month=None):
+    if month is None:
+        return base_download_dir
+    return os.path.join(base_local_dir, datetime.strptime(month, "%Y-%m").strftime("%B %Y"))
+
+# Folder of the month a date falls in; downloads land in the folder of their
+# window's first day.
+def month_folder_of(day):
+    return os.path.join(base_local_dir, day.strftime("%B %Y"))
+
+# ---------------------------------------------------------------------------
+# Calculate dynamic date range using Malaysia time zone.
+def compute_date_range():
+    now_in_malaysia = datetime.now(malaysia_tz)
+    start_date_str = f"01/{now_in_malaysia.month:02d}/{now_in_malaysia.year}"
+    end_date = now_in_malaysia + timedelta(days=1)
+    end_date_str = f"{end_date.day:02d}/{end_date.month:02d}/{end_date.year}"
+    return start_date_str, end_date_str
+
+def parse_portal_date(date_str):
+    return datetime.strptime(date_str, "%d/%m/%Y").date()
+
+def format_portal_date(day):
+    return day.strftime("%d/%m/%Y")
+
+# ---------------------------------------------------------------------------
+# Utility function to rename downloaded files for measurement points.
+def format_measurement_point_name(measurement_point):
+    return f"PGB Daily Gas Movement - {measurement_point}.xlsx"
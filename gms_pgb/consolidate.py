@@ -0,0 +1,204 @@
+import os
+import re
+import csv
+import json
+from datetime import date, datetime
+
+from .config import base_local_dir, logger
+from .state import get_manifest
+from .catalog import catalog_path
+from .workbooks import parse_row_date
+
+# ---------------------------------------------------------------------------
+# Consolidation of the renamed workbooks into one columnar dataset, partitioned
+# by month and network, with the measurement point as a column. Each workbook
+# is streamed with openpyxl's read-only row iterator and written in bounded
+# batches, so memory does not grow with the number or size of the files.
+# Parquet is written when pyarrow is installed, compact CSV otherwise. Every
+# measurement point is one file per partition, replaced on re-consolidation.
+dataset_dir = os.path.join(base_local_dir, "dataset")
+CONSOLIDATE_BATCH_ROWS = 5000
+
+def column_name(value, index):
+    name = re.sub(r"[^0-9a-zA-Z]+", "_", str(value if value is not None else "")).strip("_").lower()
+    return name or f"column_{index + 1}"
+
+def partition_value(value):
+    return re.sub(r'[\\/:*?"<>|=]+', "_", value).strip() or "_"
+
+def parse_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", "").strip())
+        except ValueError:
+            return None
+    return None
+
+# Column type from a sample of values: "date", "float" or "string".
+def infer_column_type(values):
+    values = [v for v in values if v is not None and v != ""]
+    if not values:
+        return "string"
+    if all(parse_row_date(v) is not None for v in values):
+        return "date"
+    if all(parse_number(v) is not None for v in values):
+        return "float"
+    return "string"
+
+def coerce_value(value, column_type):
+    if value is None or value == "":
+        return None
+    if column_type == "date":
+        return parse_row_date(value)
+    if column_type == "float":
+        return parse_number(value)
+    return str(value).strip()
+
+class DatasetWriter:
+    def __init__(self, path, columns, column_types):
+        self.path = path
+        self.partial_path = path + ".part"
+        self.columns = columns
+        self.column_types = column_types
+        self.rows = 0
+        if path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            arrow_types = {"date": pa.date32(), "float": pa.float64(), "string": pa.string()}
+            self.schema = pa.schema([(name, arrow_types[column_types[name]]) for name in columns])
+            self.writer = pq.ParquetWriter(self.partial_path, self.schema, compression="zstd")
+        else:
+            self.file = open(self.partial_path, "w", newline="", encoding="utf-8")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(columns)
+
+    def write(self, batch):
+        self.rows += len(batch)
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+
+            data = {name: [row[i] for row in batch] for i, name in enumerate(self.columns)}
+            self.writer.write_table(pa.Table.from_pydict(data, schema=self.schema))
+        else:
+            self.writer.writerows(
+                [value.isoformat() if isinstance(value, date) else value for value in row] for row in batch
+            )
+
+    def close(self):
+        if self.path.endswith(".parquet"):
+            self.writer.close()
+        else:
+            self.file.close()
+        os.replace(self.partial_path, self.path)
+
+# Stream one workbook into the dataset. Rows without a date (titles, column
+# headers, totals) are skipped; the last non-empty row before the data names
+# the columns. Column types are inferred from the first batch of rows.
+def consolidate_workbook(path, network, measurement_point, month, parquet):
+    import openpyxl
+
+    partition_dir = os.path.join(dataset_dir, f"month={month}", f"network={partition_value(network)}")
+    os.makedirs(partition_dir, exist_ok=True)
+    output_path = os.path.join(partition_dir, partition_value(measurement_point) + (".parquet" if parquet else ".csv"))
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    header, batch, writer = None, [], None
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            day = next((d for d in map(parse_row_date, row) if d), None)
+            if day is None:
+                if writer is None and not batch and any(cell is not None for cell in row):
+                    header = row
+                continue
+            batch.append((day, row))
+            if len(batch) >= CONSOLIDATE_BATCH_ROWS:
+                writer = write_dataset_batch(writer, output_path, header, batch, network, measurement_point)
+                batch = []
+        writer = write_dataset_batch(writer, output_path, header, batch, network, measurement_point)
+        writer.close()
+    finally:
+        workbook.close()
+    return output_path, writer.rows
+
+def write_dataset_batch(writer, output_path, header, batch, network, measurement_point):
+    if writer is None:
+        columns, column_types = dataset_columns(header, batch)
+        writer = DatasetWriter(output_path, columns, column_types)
+    if batch:
+        writer.write(normalize_rows(batch, network, measurement_point, writer.columns, writer.column_types))
+    return writer
+
+def dataset_columns(header, batch):
+    width = max([len(header or ())] + [len(row) for _, row in batch])
+    names = []
+    for i in range(width):
+        name = column_name(header[i] if header and i < len(header) else None, i)
+        while name in names or name in ("gas_day", "network", "measurement_point"):
+            name += "_"
+        names.append(name)
+    column_types = {"gas_day": "date", "network": "string", "measurement_point": "string"}
+    for i, name in enumerate(names):
+        column_types[name] = infer_column_type([row[i] if i < len(row) else None for _, row in batch])
+    return ["gas_day", "network", "measurement_point"] + names, column_types
+
+def normalize_rows(batch, network, measurement_point, columns, column_types):
+    value_columns = columns[3:]
+    return [
+        [day, network, measurement_point] + [
+            coerce_value(row[i] if i < len(row) else None, column_types[name])
+            for i, name in enumerate(value_columns)
+        ]
+        for day, row in batch
+    ]
+
+# Network of a downloaded file, from the manifest or else the catalog.
+def network_for_file(file_path, measurement_point):
+    row = get_manifest().execute(
+        "SELECT network FROM items WHERE file_path = ? AND status = 'done' ORDER BY updated_at DESC LIMIT 1",
+        (file_path,)
+    ).fetchone()
+    if row:
+        return row[0]
+    try:
+        with open(catalog_path, encoding="utf-8") as f:
+            networks = json.load(f)["networks"]
+        for network, entry in networks.items():
+            if measurement_point in entry["measurement_points"]:
+                return network
+    except (OSError, ValueError, KeyError):
+        pass
+    return "unknown"
+
+def consolidate_month(month_dir):
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        logger.error("openpyxl is required to consolidate the downloaded workbooks.")
+        return
+    try:
+        import pyarrow  # noqa: F401
+        parquet = True
+    except ImportError:
+        logger.info("pyarrow is not installed; writing the consolidated dataset as CSV.")
+        parquet = False
+    month = datetime.strptime(os.path.basename(month_dir.rstrip(os.sep)), "%B %Y").strftime("%Y-%m")
+    prefix, suffix = "PGB Daily Gas Movement - ", ".xlsx"
+    total_rows = 0
+    for name in sorted(os.listdir(month_dir)):
+        if not (name.startswith(prefix) and name.endswith(suffix)):
+            continue
+        measurement_point = name[len(prefix):-len(suffix)]
+        path = os.path.join(month_dir, name)
+        network = network_for_file(path, measurement_point)
+        try:
+            output_path, rows = consolidate_workbook(path, network, measurement_point, month, parquet)
+        except Exception as e:
+            logger.error(f"Failed to consolidate '{path}': {e}")
+            continue
+        total_rows += rows
+        logger.info(f"Consolidated {rows} rows of '{measurement_point}' into '{output_path}'")
+    logger.info(f"Consolidated dataset for {month}: {total_rows} rows under '{dataset_dir}'")
@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+from . import config
+
+# ---------------------------------------------------------------------------
+# Download tracking. A watcher is armed right before the export click and
+# claims the first .xlsx that is completed in the session's download directory
+# afterwards. On Linux it is driven by inotify (Chrome renames the finished
+# .crdownload file, which shows up as IN_MOVED_TO); elsewhere it falls back to
+# scanning the directory every poll_interval. Claimed files are shared across
+# watchers, so concurrent downloads never hand out the same file twice. Any
+# new file (the .crdownload included) marks the download as started, so an
+# export click that started nothing can be told apart from a slow download.
+IN_CREATE = 0x00000100
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct("iIII")
+
+claimed_downloads = set()
+claimed_downloads_lock = threading.Lock()
+
+def load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+libc_inotify = load_inotify()
+
+# An xlsx file is a zip archive; it is complete once its end-of-central-
+# directory record has been written.
+def download_complete(path):
+    try:
+        size = os.path.getsize(path)
+        if size < 22:
+            return False
+        with open(path, "rb") as f:
+            f.seek(max(0, size - 65557))
+            return b"PK\x05\x06" in f.read()
+    except OSError:
+        return False
+
+class DownloadWatcher:
+    def __init__(self, directory):
+        self.directory = directory
+        self.candidates = []
+        self.started = False
+        self.fd = None
+        if libc_inotify is not None:
+            fd = libc_inotify.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0 and libc_inotify.inotify_add_watch(fd, os.fsencode(directory), IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                self.fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        self.known_files = set() if self.fd is not None else set(os.listdir(directory))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def collect(self, timeout):
+        if self.fd is None:
+            time.sleep(timeout)
+            files = set(os.listdir(self.directory))
+            new_files = sorted(files - self.known_files)
+            self.candidates.extend(new_files)
+            self.started |= bool(new_files)
+            self.known_files = files
+            return
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            _, _, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if name:
+                self.candidates.append(os.fsdecode(name))
+                self.started = True
+
+    def claim(self):
+        for name in list(self.candidates):
+            if not name.endswith(".xlsx"):
+                self.candidates.remove(name)
+                continue
+            path = os.path.join(self.directory, name)
+            if not download_complete(path):
+                continue
+            self.candidates.remove(name)
+            with claimed_downloads_lock:
+                if path in claimed_downloads:
+                    continue
+                claimed_downloads.add(path)
+            return path
+        return None
+
+    # The claimed file, or None after `timeout` seconds, or after
+    # `start_timeout` seconds when no download has started by then.
+    def wait(self, timeout, start_timeout=None):
+        start = time.monotonic()
+        end_time = start + timeout
+        while True:
+            path = self.claim()
+            now = time.monotonic()
+            remaining = end_time - now
+            if path or remaining <= 0:
+                return path
+            if start_timeout is not None and not self.started and now - start >= start_timeout:
+                return None
+            self.collect(min(config.poll_interval, remaining))
+
+def release_download(path):
+    with claimed_downloads_lock:
+        claimed_downloads.discard(path)
+
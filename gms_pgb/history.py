@@ -0,0 +1,198 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+from .config import base_local_dir, logger
+from .workbooks import parse_row_date
+from .consolidate import column_name, parse_number, network_for_file
+
+# ---------------------------------------------------------------------------
+# Query store of every downloaded gas day, in downloads/history.sqlite. One
+# row per measurement point and gas day holds the workbook row as a JSON
+# object keyed by column name (numbers as numbers, dates as ISO strings), so
+# measurement points with different columns share one table. Ingest is
+# incremental (a workbook is only read again when its size or modification
+# time changed) and idempotent (rows are upserted on measurement point and
+# gas day, and only rewritten when their values differ). Indexes on
+# measurement point, network and gas day keep range lookups and aggregates
+# over years of data in the milliseconds.
+history_path = os.path.join(base_local_dir, "history.sqlite")
+WORKBOOK_PREFIX, WORKBOOK_SUFFIX = "PGB Daily Gas Movement - ", ".xlsx"
+AGGREGATES = ("sum", "avg", "min", "max", "count")
+GROUPINGS = {
+    "measurement_point": "measurement_point",
+    "network": "network",
+    "month": "substr(gas_day, 1, 7)",
+    "day": "gas_day",
+}
+
+def get_history():
+    conn = sqlite3.connect(history_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS daily ("
+        " measurement_point TEXT NOT NULL, gas_day TEXT NOT NULL, network TEXT NOT NULL,"
+        " data TEXT NOT NULL, source TEXT NOT NULL, loaded_at TEXT NOT NULL,"
+        " PRIMARY KEY (measurement_point, gas_day)) WITHOUT ROWID"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS daily_network ON daily (network, gas_day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS daily_gas_day ON daily (gas_day)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS ingested_files ("
+        " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, rows INTEGER NOT NULL)"
+    )
+    return conn
+
+def cell_value(value):
+    number = parse_number(value)
+    if number is not None:
+        return number
+    day = parse_row_date(value)
+    if day is not None:
+        return day.isoformat()
+    return str(value).strip()
+
+# Data rows of a workbook as (gas day, {column: value}); the last non-empty
+# row above the data names the columns, as in the consolidated dataset.
+def workbook_records(path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        header, names = None, None
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            day = next((d for d in map(parse_row_date, row) if d), None)
+            if day is None:
+                if names is None and any(cell is not None for cell in row):
+                    header = row
+                continue
+            if names is None or len(names) < len(row):
+                names = []
+                for i in range(len(row)):
+                    name = column_name(header[i] if header and i < len(header) else None, i)
+                    while name in names:
+                        name += "_"
+                    names.append(name)
+            yield day, {name: cell_value(value) for name, value in zip(names, row) if value is not None}
+    finally:
+        workbook.close()
+
+def ingest_workbook(conn, path, network, measurement_point):
+    loaded_at = datetime.now().isoformat(timespec="seconds")
+    rows = [(measurement_point, day.isoformat(), network,
+             json.dumps(data, ensure_ascii=False, sort_keys=True), os.path.basename(os.path.dirname(path)), loaded_at)
+            for day, data in workbook_records(path)]
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT INTO daily VALUES (?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (measurement_point, gas_day) DO UPDATE SET"
+        " network = excluded.network, data = excluded.data, source = excluded.source, loaded_at = excluded.loaded_at"
+        " WHERE daily.data != excluded.data OR daily.network != excluded.network",
+        rows
+    )
+    return len(rows), conn.total_changes - before
+
+# Load the workbooks of the given month folders (every month folder when
+# None) that are new or changed since they were last ingested.
+def ingest_months(month_dirs=None):
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        logger.error("openpyxl is required to load the downloaded workbooks into the history store.")
+        return
+    if month_dirs is None:
+        month_dirs = sorted(os.path.join(base_local_dir, name) for name in os.listdir(base_local_dir)
+                            if not name.startswith(".") and os.path.isdir(os.path.join(base_local_dir, name)))
+    conn = get_history()
+    files = read = written = 0
+    try:
+        for month_dir in month_dirs:
+            for name in sorted(os.listdir(month_dir)):
+                if not (name.startswith(WORKBOOK_PREFIX) and name.endswith(WORKBOOK_SUFFIX)):
+                    continue
+                files += 1
+                path = os.path.join(month_dir, name)
+                stat = os.stat(path)
+                known = conn.execute("SELECT size, mtime_ns FROM ingested_files WHERE path = ?", (path,)).fetchone()
+                if known == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                measurement_point = name[len(WORKBOOK_PREFIX):-len(WORKBOOK_SUFFIX)]
+                try:
+                    with conn:
+                        rows, changed = ingest_workbook(conn, path, network_for_file(path, measurement_point),
+                                                        measurement_point)
+                        conn.execute("INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?)",
+                                     (path, stat.st_size, stat.st_mtime_ns, rows))
+                except Exception as e:
+                    logger.error(f"Failed to load '{path}' into the history store: {e}")
+                    continue
+                read += 1
+                written += changed
+    finally:
+        conn.close()
+    logger.info(f"History store '{history_path}': read {read} of {files} workbooks, {written} rows added or updated.")
+
+# ---------------------------------------------------------------------------
+# Queries. Dates are ISO strings (YYYY-MM-DD) and both ends are inclusive.
+def range_filter(measurement_point=None, network=None, start=None, end=None):
+    clauses, params = [], []
+    for clause, value in (("measurement_point = ?", measurement_point), ("network = ?", network),
+                          ("gas_day >= ?", start), ("gas_day <= ?", end)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+# Daily rows as dicts: gas_day, network, measurement_point and the columns
+# (all of them, or only `columns`).
+def query_days(measurement_point=None, network=None, start=None, end=None, columns=None):
+    where, params = range_filter(measurement_point, network, start, end)
+    conn = get_history()
+    try:
+        rows = conn.execute(
+            "SELECT gas_day, network, measurement_point, data FROM daily" + where
+            + " ORDER BY measurement_point, gas_day", params
+        ).fetchall()
+    finally:
+        conn.close()
+    records = []
+    for gas_day, network_name, point, data in rows:
+        values = json.loads(data)
+        if columns:
+            values = {column: values.get(column) for column in columns}
+        record = {"gas_day": gas_day, "network": network_name, "measurement_point": point}
+        record.update((column, value) for column, value in values.items() if column not in record)
+        records.append(record)
+    return records
+
+# func(column) over the matching days, per group (measurement_point, network,
+# month or day) or overall; returns (group, value, days) tuples.
+def query_aggregate(column, func="sum", group_by=None, measurement_point=None, network=None, start=None, end=None):
+    if func not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate '{func}'; use one of {', '.join(AGGREGATES)}")
+    if group_by is not None and group_by not in GROUPINGS:
+        raise ValueError(f"Unknown grouping '{group_by}'; use one of {', '.join(GROUPINGS)}")
+    where, params = range_filter(measurement_point, network, start, end)
+    group = GROUPINGS[group_by] if group_by else "NULL"
+    conn = get_history()
+    try:
+        return conn.execute(
+            f"SELECT {group}, {func}(json_extract(data, ?)), count(*) FROM daily" + where
+            + (f" GROUP BY {group} ORDER BY {group}" if group_by else ""),
+            [f'$."{column}"'] + params
+        ).fetchall()
+    finally:
+        conn.close()
+
+# Column names seen for a measurement point (or all of them), with the days
+# that have each column.
+def query_columns(measurement_point=None):
+    where, params = range_filter(measurement_point)
+    conn = get_history()
+    try:
+        return conn.execute(
+            "SELECT key, count(*) FROM daily, json_each(daily.data)" + where + " GROUP BY key ORDER BY key", params
+        ).fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,165 @@
+import os
+import time
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from . import browser
+from .config import base_download_dir, logger
+from .metrics import timed_step
+from .state import record_item, store_download, note_stored
+
+# ---------------------------------------------------------------------------
+# Direct HTTP export: Selenium only logs in, then the session cookies are
+# handed to a pooled HTTP client that replays the search/export requests.
+# Endpoints and form field names are read from the page; GMS_SEARCH_URL,
+# GMS_EXPORT_URL and GMS_EXPORT_METHOD override them.
+HTTP_ENDPOINT_PROBE_JS = """
+function fieldName(id) {
+    var el = document.getElementById(id);
+    return (el && el.getAttribute('name')) || id;
+}
+function absolute(url) {
+    if (!url || url === '#' || url.indexOf('javascript:') === 0) return null;
+    return new URL(url, document.baseURI).href;
+}
+var exportButton = document.getElementById('PGBdailygasmovement-export');
+var searchButton = document.getElementById('search');
+var form = (exportButton && exportButton.closest('form')) || document.querySelector('form');
+var exportUrl = exportButton && absolute(exportButton.getAttribute('href') ||
+    exportButton.getAttribute('data-url') || exportButton.getAttribute('formaction'));
+if (!exportUrl && form) exportUrl = absolute(form.getAttribute('action'));
+var searchUrl = searchButton && absolute(searchButton.getAttribute('data-url') ||
+    searchButton.getAttribute('formaction'));
+return {
+    export_url: exportUrl,
+    search_url: searchUrl,
+    method: ((form && form.getAttribute('method')) || 'GET').toUpperCase(),
+    fields: {
+        network: fieldName('NetworkCode'),
+        measurement_point: fieldName('MeasurePointDropDownList'),
+        start_date: fieldName('DataProviderDatePicker'),
+        end_date: fieldName('EndDateDatePicker')
+    }
+};
+"""
+
+def discover_http_endpoints():
+    probe = browser.driver.execute_script(HTTP_ENDPOINT_PROBE_JS) or {}
+    return {
+        "search_url": os.environ.get("GMS_SEARCH_URL") or probe.get("search_url"),
+        "export_url": os.environ.get("GMS_EXPORT_URL") or probe.get("export_url"),
+        "method": (os.environ.get("GMS_EXPORT_METHOD") or probe.get("method") or "GET").upper(),
+        "fields": probe.get("fields") or {
+            "network": "NetworkCode",
+            "measurement_point": "MeasurePointDropDownList",
+            "start_date": "DataProviderDatePicker",
+            "end_date": "EndDateDatePicker",
+        },
+    }
+
+def build_http_session(pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = browser.driver.execute_script("return navigator.userAgent;")
+    session.headers["Referer"] = browser.driver.current_url
+    for cookie in browser.driver.get_cookies():
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+    return session
+
+def http_export_item(session, endpoints, network, measurement_point, start_date_str, end_date_str, option_values):
+    fields = endpoints["fields"]
+    params = {
+        fields["network"]: option_values.get(network, network),
+        fields["measurement_point"]: option_values.get((network, measurement_point), measurement_point),
+        fields["start_date"]: start_date_str,
+        fields["end_date"]: end_date_str,
+    }
+    payload_key = "params" if endpoints["method"] == "GET" else "data"
+    with timed_step("http_export", network, measurement_point) as span:
+        content = http_fetch_export(session, endpoints, network, measurement_point, params, payload_key)
+        if content is None:
+            span["status"] = "error"
+    if content is None:
+        return None
+    # A unique name per item: points of different networks may share a name.
+    # The .xlsx suffix lets openpyxl read it for validation.
+    with tempfile.NamedTemporaryFile(dir=base_download_dir, prefix=".http-", suffix=".xlsx", delete=False) as f:
+        f.write(content)
+    logger.info(f"Exported '{measurement_point}' over HTTP ({len(content)} bytes)")
+    return f.name
+
+def http_fetch_export(session, endpoints, network, measurement_point, params, payload_key):
+    try:
+        if endpoints["search_url"]:
+            search = session.request(endpoints["method"], endpoints["search_url"], timeout=300, **{payload_key: params})
+            search.raise_for_status()
+        response = session.request(endpoints["method"], endpoints["export_url"], timeout=300, **{payload_key: params})
+        response.raise_for_status()
+        # An expired session or error page comes back as HTML, not an xlsx (zip) file.
+        if not response.content.startswith(b"PK"):
+            raise ValueError(f"unexpected export payload ({response.headers.get('Content-Type')})")
+    except Exception as e:
+        logger.warning(f"HTTP export failed for measurement point '{measurement_point}' of network '{network}': {e}")
+        return None
+    return response.content
+
+# Run every work item over HTTP; returns the items that need the browser path.
+# Without a controller every item is queued at once on `concurrency` threads;
+# with one, no more requests than its current limit are in flight.
+def run_http_exports(work_items, start_date_str, end_date_str, concurrency, option_values, windows, results,
+                     controller=None):
+    endpoints = discover_http_endpoints()
+    if not endpoints["export_url"]:
+        logger.warning("Could not determine the export endpoint. Falling back to the browser for all items.")
+        return list(work_items)
+    logger.info(f"HTTP export mode: {endpoints['method']} {endpoints['export_url']} (search: {endpoints['search_url']})")
+    session = build_http_session(concurrency)
+    failed_items = []
+    pending = deque(work_items)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+        while pending or in_flight:
+            limit = controller.allowed if controller else concurrency
+            while pending and len(in_flight) < limit:
+                network, measurement_point = item = pending.popleft()
+                future = pool.submit(http_export_item, session, endpoints, network, measurement_point,
+                                     windows.get(item, start_date_str), end_date_str, option_values)
+                in_flight[future] = (item, time.monotonic())
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                (network, measurement_point), submitted = in_flight.pop(future)
+                partial_path = future.result()
+                if partial_path:
+                    if controller:
+                        controller.observe("export", time.monotonic() - submitted)
+                    item_start = windows.get((network, measurement_point), start_date_str)
+                    try:
+                        with timed_step("store", network, measurement_point):
+                            changed_rows = store_download(network, measurement_point, partial_path, item_start,
+                                                          end_date_str)
+                    except Exception as e:
+                        # One bad workbook must not abandon the exports still in flight.
+                        logger.error(f"Storing the export of measurement point '{measurement_point}' of network "
+                                     f"'{network}' failed: {e}. Skipping this combination.")
+                        if os.path.exists(partial_path):
+                            os.remove(partial_path)
+                        results["skipped"].append(f"{network} - {measurement_point}")
+                        record_item(network, measurement_point, item_start, end_date_str, "failed")
+                        continue
+                    note_stored(results, network, measurement_point, changed_rows)
+                else:
+                    if controller:
+                        controller.observe("export", time.monotonic() - submitted, "failed")
+                    failed_items.append((network, measurement_point))
+    session.close()
+    if controller:
+        controller.log_summary()
+    # Keep the original order so the browser fallback re-selects networks as little as possible.
+    failed_items = set(failed_items)
+    return [item for item in work_items if item in failed_items]
@@ -0,0 +1,163 @@
+import os
+import time
+import json
+import math
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from .config import base_local_dir, logger, malaysia_tz
+
+# ---------------------------------------------------------------------------
+# Per-step timing spans (login, selection, search, export click, download,
+# store), tagged with network and measurement point. Spans are appended to a
+# JSON lines file as they finish; the end-of-run summary adds p50/p95/max per
+# step and per network and writes a Prometheus text file. Spawned workers
+# inherit GMS_RUN_ID and append to the same file.
+run_id = os.environ.setdefault("GMS_RUN_ID", datetime.now(malaysia_tz).strftime("%Y%m%d-%H%M%S"))
+metrics_dir = os.path.join(base_local_dir, "metrics")
+spans_filename = os.path.join(metrics_dir, f"steps-{run_id}.jsonl")
+prometheus_filename = os.path.join(metrics_dir, "gms_pgb.prom")
+step_spans = []
+spans_lock = threading.Lock()
+
+# Entries added to every span started inside tagged_spans(), such as
+# phase="refetch" for the gap re-fetch pass.
+span_tags = {}
+
+@contextmanager
+def tagged_spans(**tags):
+    span_tags.update(tags)
+    try:
+        yield
+    finally:
+        for key in tags:
+            span_tags.pop(key, None)
+
+@contextmanager
+def timed_step(step, network="", measurement_point=""):
+    span = start_span(step, network, measurement_point)
+    try:
+        yield span
+    except BaseException:
+        span["status"] = "error"
+        raise
+    finally:
+        finish_span(span)
+
+# Spans for steps that do not run inside one block (the tab pipeline starts a
+# search on one pass and sees it finish on a later one).
+def start_span(step, network="", measurement_point=""):
+    span = {"step": step, "network": network, "measurement_point": measurement_point,
+            "started_at": datetime.now().isoformat(timespec="milliseconds"), "status": "ok"}
+    span.update(span_tags)
+    span["start"] = time.monotonic()
+    return span
+
+def finish_span(span, status=None):
+    if status is not None:
+        span["status"] = status
+    span["seconds"] = round(time.monotonic() - span.pop("start"), 3)
+    span["pid"] = os.getpid()
+    with spans_lock:
+        step_spans.append(span)
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(spans_filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps(span, ensure_ascii=False) + "\n")
+
+# Totals of the event-driven waits recorded by browser.wait_for.
+def log_wait_timings(timings):
+    totals = {}
+    for name, seconds in timings:
+        totals.setdefault(name, []).append(seconds)
+    if not totals:
+        return
+    logger.info("Wait timings (count, total, mean, max in seconds):")
+    for name, durations in sorted(totals.items()):
+        logger.info(f" - {name}: {len(durations)}, {sum(durations):.1f}, "
+                    f"{sum(durations) / len(durations):.2f}, {max(durations):.2f}")
+
+# Peak browser memory per session and the mean load time of the portal page,
+# from the samples taken by browser.log_session_resources.
+def log_session_stats(stats):
+    rss = [s["rss_bytes"] for s in stats if s.get("rss_bytes") is not None]
+    loads = [s["load_ms"] for s in stats if s.get("load_ms") is not None]
+    if rss:
+        logger.info(f"Browser RSS per session: peak {max(rss) / 2 ** 20:.0f} MiB, "
+                    f"mean {sum(rss) / len(rss) / 2 ** 20:.0f} MiB over {len(rss)} samples")
+    if loads:
+        logger.info(f"Portal page load: mean {sum(loads) / len(loads):.0f} ms, max {max(loads)} ms "
+                    f"over {len(loads)} loads")
+
+# Nearest-rank percentile of an already sorted list.
+def percentile(sorted_values, fraction):
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize_spans(spans, key):
+    groups = {}
+    for span in spans:
+        groups.setdefault(key(span), []).append(span["seconds"])
+    return {
+        group: {"count": len(values), "sum": sum(values), "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95), "max": values[-1]}
+        for group, values in ((group, sorted(values)) for group, values in groups.items())
+    }
+
+def prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def write_prometheus_metrics(spans):
+    lines = [
+        "# HELP gms_pgb_step_duration_seconds Duration of each download step.",
+        "# TYPE gms_pgb_step_duration_seconds summary",
+    ]
+    by_step_network = summarize_spans(spans, lambda s: (s["step"], s["network"]))
+    for (step, network), stats in sorted(by_step_network.items()):
+        labels = f'step="{prometheus_label(step)}",network="{prometheus_label(network)}"'
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+            lines.append(f'gms_pgb_step_duration_seconds{{{labels},quantile="{quantile}"}} {stats[key]:.3f}')
+        lines.append(f"gms_pgb_step_duration_seconds_sum{{{labels}}} {stats['sum']:.3f}")
+        lines.append(f"gms_pgb_step_duration_seconds_count{{{labels}}} {stats['count']}")
+    lines += [
+        "# HELP gms_pgb_step_duration_seconds_max Longest duration of each download step.",
+        "# TYPE gms_pgb_step_duration_seconds_max gauge",
+    ]
+    for (step, network), stats in sorted(by_step_network.items()):
+        labels = f'step="{prometheus_label(step)}",network="{prometheus_label(network)}"'
+        lines.append(f"gms_pgb_step_duration_seconds_max{{{labels}}} {stats['max']:.3f}")
+    lines += [
+        "# HELP gms_pgb_step_failures_total Steps that did not finish with status ok.",
+        "# TYPE gms_pgb_step_failures_total counter",
+    ]
+    failures = {}
+    for span in spans:
+        if span["status"] not in ("ok", "no_data"):
+            key = (span["step"], span["status"])
+            failures[key] = failures.get(key, 0) + 1
+    for (step, status), count in sorted(failures.items()):
+        lines.append(f'gms_pgb_step_failures_total{{step="{prometheus_label(step)}",status="{prometheus_label(status)}"}} {count}')
+    lines += [
+        "# HELP gms_pgb_no_data_total Searches that found no rows, so nothing was exported.",
+        "# TYPE gms_pgb_no_data_total counter",
+        f"gms_pgb_no_data_total {sum(1 for span in spans if span['status'] == 'no_data')}",
+    ]
+    lines.append(f"gms_pgb_last_run_timestamp_seconds {time.time():.0f}")
+    os.makedirs(metrics_dir, exist_ok=True)
+    partial_path = prometheus_filename + ".part"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(partial_path, prometheus_filename)
+
+def log_step_timings(spans):
+    if not spans:
+        return
+    logger.info("Step timings (count, p50, p95, max in seconds):")
+    for step, stats in sorted(summarize_spans(spans, lambda s: s["step"]).items()):
+        logger.info(f" - {step}: {stats['count']}, {stats['p50']:.2f}, {stats['p95']:.2f}, {stats['max']:.2f}")
+    item_spans = [span for span in spans if span["step"] == "item"]
+    if item_spans:
+        logger.info("Item timings per network (count, p50, p95, max in seconds):")
+        for network, stats in sorted(summarize_spans(item_spans, lambda s: s["network"]).items()):
+            logger.info(f" - {network}: {stats['count']}, {stats['p50']:.2f}, {stats['p95']:.2f}, {stats['max']:.2f}")
+    logger.info(f"Step spans written to '{spans_filename}', metrics to '{prometheus_filename}'")
@@ -0,0 +1,82 @@
+import time
+import random
+
+from .config import logger, env_number
+from .state import record_item
+
+# ---------------------------------------------------------------------------
+# Retry policy. An item's failures are classified, and each class has its own
+# limit on attempts and its own exponential backoff. The backoff has jitter,
+# so workers and tabs that hit the same slow portal do not retry in lockstep.
+#   selection         a dropdown option could not be selected
+#   portal_timeout    the search results did not load
+#   export_missing    the results loaded without an export button
+#   download_missing  the export click started no download
+#   browser_crash     the WebDriver session failed
+# Every item also has a time budget: GMS_ITEM_BUDGET seconds (--item-budget,
+# default 600, 0 for none). The budget caps the item's waits as well as its
+# retries, so an item that cannot succeed gives up early instead of holding
+# a slot for many minutes.
+RETRY_POLICIES = {
+    # class: (attempts, first backoff, longest backoff) in seconds
+    "selection": (3, 1.0, 5.0),
+    "portal_timeout": (2, 15.0, 60.0),
+    "export_missing": (2, 5.0, 30.0),
+    "download_missing": (2, 5.0, 30.0),
+    "browser_crash": (3, 5.0, 60.0),
+}
+item_budget = env_number("GMS_ITEM_BUDGET", 600)
+
+# Seconds an export click gets to start a download (a file appearing in the
+# download directory) before it counts as download_missing.
+DOWNLOAD_START_TIMEOUT = 30
+
+# A classified failure of one attempt at an item.
+class ItemFailure(Exception):
+    def __init__(self, failure, message):
+        super().__init__(message)
+        self.failure = failure
+
+# Wait before the next attempt after the given number of failures of a class:
+# the doubled backoff, capped, with "equal jitter" (a random half of it).
+def backoff(failure, failures):
+    attempts, first, longest = RETRY_POLICIES[failure]
+    delay = min(longest, first * 2 ** (failures - 1))
+    return random.uniform(delay / 2, delay)
+
+class ItemRetries:
+    def __init__(self, network, measurement_point):
+        self.item = f"{network} - {measurement_point}"
+        self.deadline = time.monotonic() + item_budget if item_budget else None
+        self.failures = {}
+
+    # A wait of at most `timeout` seconds that fits the item's budget.
+    def remaining(self, timeout):
+        if self.deadline is None:
+            return timeout
+        return max(1.0, min(timeout, self.deadline - time.monotonic()))
+
+    # Count a failure; returns the seconds to wait before the next attempt,
+    # or None when the item should give up.
+    def retry_after(self, failure, message):
+        count = self.failures[failure] = self.failures.get(failure, 0) + 1
+        attempts = RETRY_POLICIES[failure][0]
+        if count >= attempts:
+            logger.warning(f"Giving up on '{self.item}' after {count} {failure} failure(s): {message}")
+            return None
+        delay = backoff(failure, count)
+        if self.deadline is not None and time.monotonic() + delay >= self.deadline:
+            logger.warning(f"Giving up on '{self.item}': its {item_budget:.0f}s budget is spent ({failure}: {message})")
+            return None
+        logger.info(f"{failure} for '{self.item}' ({count}/{attempts}): {message}. Retrying in {delay:.1f}s.")
+        return delay
+
+# An item that gave up: skipped, checkpointed as failed and listed with the
+# class of its last failure for the summary.
+def record_give_up(results, network, measurement_point, start_date_str, end_date_str, failure):
+    item = f"{network} - {measurement_point}"
+    if failure == "portal_timeout":
+        results["timeout"].append(item)
+    results["skipped"].append(item)
+    results["failures"].append((item, failure))
+    record_item(network, measurement_point, start_date_str, end_date_str, "failed")
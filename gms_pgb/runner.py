@@ -0,0 +1,488 @@
+import os
+import time
+import shutil
+import traceback
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from selenium.common.exceptions import WebDriverException, TimeoutException
+
+from . import browser, metrics
+from .config import base_download_dir, logger, setup_logging
+from .metrics import timed_step
+from .downloads import DownloadWatcher, release_download
+from .state import (record_item, store_download, note_stored, record_no_data, pending_gaps, completed_items,
+                    filter_completed, plan_windows)
+from .catalog import load_catalog, save_catalog, apply_rediscoveries, catalog_work_items, catalog_option_values
+from .watchdog import BrowserWatchdog
+from .retry import ItemFailure, ItemRetries, record_give_up
+from .schedule import load_durations, record_durations, predict_durations, lpt_order, lpt_shards, log_plan, log_finish
+
+# ---------------------------------------------------------------------------
+# Result lists shared by the serial loop and the worker pool.
+def new_results():
+    return {"downloaded": [], "skipped": [], "timeout": [], "resumed": [], "rediscovered": [], "waits": [], "spans": [],
+            "sessions": [], "changed": [], "unchanged": [], "invalid": [], "refetched": [], "failures": [], "no_data": []}
+
+def merge_results(results, other):
+    for key in results:
+        results[key].extend(other[key])
+
+# Raised when a measurement point from the catalog can no longer be selected.
+class MeasurementPointMissing(Exception):
+    pass
+
+# ---------------------------------------------------------------------------
+# Search, export and rename a single measurement point. The network must
+# already be selected in the first dropdown. Failed attempts are classified
+# and retried under the item's retry policy (see retry.py); a point that
+# cannot be selected raises MeasurementPointMissing for re-discovery.
+SEARCH_TIMEOUT = 300
+EXPORT_BUTTON_TIMEOUT = 30
+DOWNLOAD_TIMEOUT = 120
+
+def process_measurement_point(network, measurement_point, start_date_str, end_date_str, results, retries=None):
+    retries = retries or ItemRetries(network, measurement_point)
+    attempt = 1
+    while True:
+        try:
+            logger.info(f"Processing measurement point: {measurement_point} for network: {network} (attempt {attempt})")
+            export_measurement_point(network, measurement_point, start_date_str, end_date_str, results, retries)
+            return
+        except MeasurementPointMissing:
+            raise
+        except ItemFailure as e:
+            failure, message = e.failure, str(e)
+        except TimeoutException as e:
+            if not browser.browser_alive():
+                failure, message = "browser_crash", e.msg
+                browser.reinitialize_driver(network)
+            else:
+                failure, message = "portal_timeout", e.msg
+        except WebDriverException as wde:
+            failure, message = "browser_crash", wde.msg
+            logger.warning(f"WebDriverException for measurement point '{measurement_point}' of network '{network}': {wde}. Reinitializing driver...")
+            browser.reinitialize_driver(network)
+        except Exception as e:
+            logger.error(f"Exception for measurement point '{measurement_point}' of network '{network}': {e}. Skipping this combination.")
+            results["skipped"].append(f"{network} - {measurement_point}")
+            record_item(network, measurement_point, start_date_str, end_date_str, "failed")
+            return
+        delay = retries.retry_after(failure, message)
+        if delay is None:
+            record_give_up(results, network, measurement_point, start_date_str, end_date_str, failure)
+            return
+        time.sleep(delay)
+        attempt += 1
+
+# One attempt; raises ItemFailure when a step fails. Waits are capped by what
+# is left of the item's time budget.
+def export_measurement_point(network, measurement_point, start_date_str, end_date_str, results, retries):
+    # Select the measurement point explicitly.
+    with timed_step("select_measurement_point", network, measurement_point) as span:
+        selected = browser.select_dropdown(2, measurement_point)
+        if not selected:
+            span["status"] = "not_selected"
+    if not selected:
+        raise MeasurementPointMissing(f"'{measurement_point}' is not in the dropdown of network '{network}'")
+    with timed_step("search", network, measurement_point) as span:
+        browser.set_date_input(start_date_str, start=True)
+        browser.set_date_input(end_date_str, start=False)
+        previous_rows = browser.click_search()
+        loaded = browser.wait_for_loading(timeout=retries.remaining(SEARCH_TIMEOUT), network_name=network,
+                                          previous_rows=previous_rows)
+        empty = loaded and browser.search_result_empty()
+        if not loaded:
+            span["status"] = "timeout"
+        elif empty:
+            span["status"] = "no_data"
+    if not loaded:
+        raise ItemFailure("portal_timeout", "the search results did not load")
+    if empty:
+        record_no_data(results, network, measurement_point, start_date_str, end_date_str)
+        return
+    watcher = DownloadWatcher(browser.driver_download_dir)
+    try:
+        with timed_step("export_click", network, measurement_point) as span:
+            exported = browser.click_export_button(timeout=retries.remaining(EXPORT_BUTTON_TIMEOUT))
+            if not exported:
+                span["status"] = "missing"
+        if not exported:
+            raise ItemFailure("export_missing", "no export button")
+        with timed_step("download", network, measurement_point) as span:
+            downloaded_file = browser.wait_for_download(watcher, timeout=retries.remaining(DOWNLOAD_TIMEOUT))
+            if not downloaded_file:
+                span["status"] = "missing"
+    finally:
+        watcher.close()
+    if not downloaded_file:
+        raise ItemFailure("download_missing", "no file was downloaded")
+    try:
+        with timed_step("store", network, measurement_point):
+            changed_rows = store_download(network, measurement_point, downloaded_file, start_date_str, end_date_str)
+    except Exception as e:
+        # Keep the bad file out of the download directory (the month folder
+        # with a single session) and retry the item.
+        if os.path.exists(downloaded_file):
+            os.remove(downloaded_file)
+        release_download(downloaded_file)
+        raise ItemFailure("download_missing", f"storing the export failed: {e}")
+    release_download(downloaded_file)
+    note_stored(results, network, measurement_point, changed_rows)
+
+# ---------------------------------------------------------------------------
+# Process a list of (network, measurement point) work items in the current
+# session, re-selecting the network only when it changes. A point that can no
+# longer be selected triggers a re-discovery of its network (once per run);
+# points that turn up only then are appended to the work list. A point that
+# stays unselectable is retried, then given up, as a "selection" failure.
+# Between items the watchdog may restart the browser before it degrades.
+def run_work_items(work_items, start_date_str, end_date_str, results, windows=None):
+    windows = windows or {}
+    work_items = list(work_items)
+    rediscovered = set()
+    current_network = None
+    watchdog = BrowserWatchdog()
+    previous_point = None
+    for network, measurement_point in work_items:
+        reason = previous_point and watchdog.check(previous_point)
+        if reason:
+            watchdog.recycle(reason, current_network)
+        previous_point = measurement_point
+        item_start = windows.get((network, measurement_point), start_date_str)
+        if network != current_network:
+            with timed_step("select_network", network) as span:
+                try:
+                    selected = browser.select_dropdown(1, network)
+                except WebDriverException as wde:
+                    logger.warning(f"WebDriverException while selecting network '{network}': {wde.msg}. Reinitializing driver...")
+                    browser.reinitialize_driver(network)
+                    selected = browser.select_dropdown(1, network)
+                if selected:
+                    browser.wait_for("measurement points reloaded", browser.dropdown_idle(2))
+                else:
+                    span["status"] = "not_selected"
+            if not selected:
+                logger.error(f"Network '{network}' could not be selected. Skipping '{measurement_point}'.")
+                record_give_up(results, network, measurement_point, item_start, end_date_str, "selection")
+                continue
+            current_network = network
+        retries = ItemRetries(network, measurement_point)
+        while True:
+            try:
+                with timed_step("item", network, measurement_point):
+                    process_measurement_point(network, measurement_point, item_start, end_date_str, results, retries)
+                break
+            except MeasurementPointMissing as e:
+                message = str(e)
+            if network not in rediscovered:
+                rediscovered.add(network)
+                logger.warning(f"{message}. Re-discovering measurement points for network '{network}'.")
+                measurement_point_names = browser.rediscover_network(network, results)
+                work_items.extend((network, point) for point in measurement_point_names
+                                  if (network, point) not in work_items)
+                if measurement_point in measurement_point_names:
+                    continue
+            delay = retries.retry_after("selection", message)
+            if delay is None:
+                logger.error(f"Measurement point '{measurement_point}' of network '{network}' has vanished. Skipping...")
+                record_give_up(results, network, measurement_point, item_start, end_date_str, "selection")
+                break
+            time.sleep(delay)
+
+# AIMD controller for up to `ceiling` parallel requests, or None without
+# --adaptive. `adaptive` carries the --min-concurrency and --latency-factor
+# settings as a dict, so it can be handed to spawned workers.
+def build_controller(name, ceiling, adaptive):
+    if not adaptive:
+        return None
+    from .concurrency import AimdController
+
+    return AimdController(name, min(adaptive["min_concurrency"], ceiling), ceiling, adaptive["latency_factor"])
+
+# Run work items in the current session: pipelined across browser tabs with
+# --tabs above 1, one after another otherwise.
+def run_session_items(work_items, start_date_str, end_date_str, results, windows=None, tabs=1, adaptive=None):
+    if tabs > 1 and len(work_items) > 1:
+        from .tabs import TabPipeline
+
+        tabs = min(tabs, len(work_items))
+        controller = build_controller("tabs", tabs, adaptive)
+        TabPipeline(work_items, tabs, start_date_str, end_date_str, results, windows, controller).run()
+    else:
+        run_work_items(work_items, start_date_str, end_date_str, results, windows)
+
+# Narrow re-fetch of the days that validation found missing in the exports of
+# these items, one pass per distinct window, while the session is still
+# logged in. Only the re-fetched gaps and changed rows are added to the
+# results; the items already count as downloaded.
+def refetch_gaps(work_items, start_date_str, end_date_str, results, tabs=1, adaptive=None):
+    gap_windows = {}
+    for network, measurement_point, gap_start, gap_end in pending_gaps(work_items, start_date_str, end_date_str):
+        gap_windows.setdefault((gap_start, gap_end), []).append((network, measurement_point))
+    for (gap_start, gap_end), items in gap_windows.items():
+        logger.info(f"Re-fetching {gap_start} - {gap_end} for {len(items)} measurement points with missing days.")
+        refetch_results = new_results()
+        with metrics.tagged_spans(phase="refetch"):
+            run_session_items(items, gap_start, gap_end, refetch_results, None, tabs, adaptive)
+        for key in ("changed", "timeout", "rediscovered", "invalid", "no_data"):
+            results[key].extend(refetch_results[key])
+        results["refetched"].extend(f"{network} - {measurement_point} ({gap_start} - {gap_end})"
+                                    for network, measurement_point in items)
+
+# ---------------------------------------------------------------------------
+# Split work items into contiguous, evenly sized shards so that each worker
+# touches as few networks as possible.
+def shard_work_items(work_items, num_shards):
+    shards = []
+    base, extra = divmod(len(work_items), num_shards)
+    start = 0
+    for i in range(num_shards):
+        size = base + (1 if i < extra else 0)
+        if size:
+            shards.append(work_items[start:start + size])
+        start += size
+    return shards
+
+# Items of a crashed worker that have no outcome yet. Stored items are listed
+# by measurement point alone, every other outcome as "network - point".
+def unfinished_items(work_items, results):
+    finished = set(results["downloaded"]) | set(results["skipped"]) | set(results["no_data"]) \
+        | set(results["invalid"]) | {item for item, failure in results["failures"]}
+    return [f"{network} - {measurement_point}" for network, measurement_point in work_items
+            if measurement_point not in finished and f"{network} - {measurement_point}" not in finished]
+
+# ---------------------------------------------------------------------------
+# Worker process entry point: its own Chrome session, its own download
+# directory and its own login. Renamed files land in the shared month folder.
+def run_worker(worker_id, work_items, start_date_str, end_date_str, windows, tabs=1, adaptive=None):
+    setup_logging(filemode='a', log_format=f'%(asctime)s - %(levelname)s - [worker {worker_id}] %(message)s')
+    worker_download_dir = os.path.join(base_download_dir, f".worker-{worker_id}")
+    os.makedirs(worker_download_dir, exist_ok=True)
+    results = new_results()
+    try:
+        browser.init_driver(worker_download_dir)
+        browser.login_and_navigate()
+        browser.prepare_recovery()
+        run_session_items(work_items, start_date_str, end_date_str, results, windows, tabs, adaptive)
+        refetch_gaps(work_items, start_date_str, end_date_str, results, tabs, adaptive)
+    except Exception as e:
+        logger.error(f"Worker {worker_id} failed: {e}")
+        logger.error(traceback.format_exc())
+        results["skipped"].extend(unfinished_items(work_items, results))
+    finally:
+        if browser.driver is not None:
+            try:
+                browser.quit_driver()
+            except Exception:
+                pass
+        browser.shutdown_standby()
+        shutil.rmtree(worker_download_dir, ignore_errors=True)
+    results["waits"].extend(browser.wait_timings)
+    results["sessions"].extend(browser.session_stats)
+    results["spans"].extend(metrics.step_spans)
+    return results
+
+# With duration history (`predicted`), shards are balanced by predicted work
+# instead of by item count.
+def run_worker_pool(work_items, num_workers, start_date_str, end_date_str, windows, results, tabs=1, adaptive=None,
+                    predicted=None):
+    if predicted:
+        shards, loads = lpt_shards(work_items, predicted, num_workers)
+        if tabs == 1:
+            # One tab works through its shard in any order in the same time;
+            # keep the catalog order so that it switches networks less often.
+            position = {item: i for i, item in enumerate(work_items)}
+            shards = [sorted(shard, key=position.get) for shard in shards]
+        logger.info("Predicted worker loads: " + ", ".join(f"{load / 60:.1f} min" for load in loads))
+    else:
+        shards = shard_work_items(work_items, num_workers)
+    logger.info(f"Starting {len(shards)} workers for {len(work_items)} work items.")
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(run_worker, worker_id, shard, start_date_str, end_date_str,
+                        {item: windows[item] for item in shard if item in windows}, tabs, adaptive): worker_id
+            for worker_id, shard in enumerate(shards, start=1)
+        }
+        for future in as_completed(futures):
+            worker_id = futures[future]
+            try:
+                merge_results(results, future.result())
+                logger.info(f"Worker {worker_id} finished.")
+            except Exception as e:
+                logger.error(f"Worker {worker_id} crashed: {e}")
+                for network, measurement_point in shards[worker_id - 1]:
+                    results["skipped"].append(f"{network} - {measurement_point}")
+
+# ---------------------------------------------------------------------------
+# Log summary of processing.
+def log_summary(network_names, results):
+    downloaded_networks = results["downloaded"]
+    skipped_networks = results["skipped"]
+    timeout_networks = results["timeout"]
+
+    logger.info("\n=== Summary ===")
+    logger.info(f"Total networks processed: {len(network_names)}")
+    logger.info(f"Downloaded items count: {len(downloaded_networks)}")
+    logger.info(f"Skipped items count: {len(skipped_networks)}")
+    logger.info(f"Items with page load timeout: {len(timeout_networks)}")
+    logger.info(f"Items with no data for the date range: {len(results['no_data'])}")
+    if results["resumed"]:
+        logger.info(f"Items already downloaded by an earlier run (resumed): {len(results['resumed'])}")
+
+    if downloaded_networks:
+        logger.info("Downloaded measurement points:")
+        for item in downloaded_networks:
+            logger.info(f" - {item}")
+    else:
+        logger.info("No items were downloaded.")
+
+    if skipped_networks:
+        logger.info("Skipped items:")
+        for item in skipped_networks:
+            logger.info(f" - {item}")
+    else:
+        logger.info("All items were downloaded successfully.")
+
+    if results["no_data"]:
+        logger.info("Items with no data (export skipped):")
+        for item in results["no_data"]:
+            logger.info(f" - {item}")
+
+    if timeout_networks:
+        logger.info("Items that timed out on page load:")
+        for item in timeout_networks:
+            logger.info(f" - {item}")
+    else:
+        logger.info("No items timed out on page load.")
+
+    if results["failures"]:
+        by_class = {}
+        for item, failure in results["failures"]:
+            by_class.setdefault(failure, []).append(item)
+        logger.info("Items that gave up, by failure class:")
+        for failure, items in sorted(by_class.items()):
+            logger.info(f" - {failure} ({len(items)}): {', '.join(items)}")
+
+    if results["invalid"]:
+        logger.info("Exports rejected by validation (fetched again later):")
+        for item in results["invalid"]:
+            logger.info(f" - {item}")
+    if results["refetched"]:
+        logger.info("Missing days re-fetched:")
+        for item in results["refetched"]:
+            logger.info(f" - {item}")
+
+    if results["changed"]:
+        logger.info(f"Measurement points with new or changed rows ({len(results['changed'])}, "
+                    f"{len(results['unchanged'])} unchanged):")
+        for item in results["changed"]:
+            logger.info(f" - {item}")
+    elif results["downloaded"]:
+        logger.info("No downloaded measurement point had new or changed rows.")
+
+    metrics.log_wait_timings(results["waits"])
+    metrics.log_session_stats(results["sessions"])
+    metrics.log_step_timings(results["spans"])
+
+# ---------------------------------------------------------------------------
+# Catalog of networks and measurement points: the cached one, or one
+# discovered after a fresh login. With keep_browser the logged-in browser is
+# left open for the caller; worker processes log in on their own, so with a
+# cached catalog and no keep_browser the main process needs no browser at all.
+def open_catalog(args, keep_browser):
+    catalog = None if args.refresh_catalog else load_catalog(args.catalog_ttl)
+    if catalog is None or keep_browser:
+        browser.init_driver(base_download_dir)
+
+        # Begin by logging in and navigating to the target page.
+        try:
+            browser.login_and_navigate()
+        except Exception as e:
+            logger.error("Initial login failed. Exiting.")
+            browser.driver.quit()
+            raise e
+
+    if catalog is None:
+        try:
+            network_names = browser.get_network_names()
+            logger.info(f"Found {len(network_names)} networks: {network_names}")
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            browser.driver.quit()
+            raise e
+        catalog = browser.discover_catalog(network_names)
+        save_catalog(catalog)
+    return catalog
+
+# ---------------------------------------------------------------------------
+# The download command: log in (unless a cached catalog lets the workers do
+# it on their own), build the work list and run it serially, over HTTP or in
+# the worker pool. Returns the results and the networks that were processed.
+def run_download(args, start_date_str, end_date_str):
+    results = new_results()
+    catalog = open_catalog(args, keep_browser=args.workers == 1)
+
+    network_names = list(catalog["networks"])
+    work_items = catalog_work_items(catalog, results)
+    windows = plan_windows(work_items, start_date_str, end_date_str, args.full_month)
+    if args.resume:
+        completed = completed_items(end_date_str)
+        logger.info(f"Resuming: {len(completed)} items already downloaded for this date range.")
+        work_items = filter_completed(work_items, completed, results)
+
+    if args.http or args.workers == 1:
+        browser.prepare_recovery()
+
+    adaptive = None
+    if args.adaptive:
+        adaptive = {"min_concurrency": args.min_concurrency, "latency_factor": args.latency_factor}
+
+    # Longest items first, so that no slot is left with a long item at the end
+    # while the others sit idle. A single session without tabs has one slot and
+    # keeps the catalog order; HTTP exports take a fraction of a browser item's
+    # time, so the browser history says nothing about them.
+    started_at = datetime.now()
+    predicted = {} if args.http else predict_durations(work_items, load_durations())
+    predicted_seconds = None if args.http else log_plan(work_items, predicted, args.workers * args.tabs, started_at)
+    if predicted and args.workers == 1 and args.tabs > 1:
+        work_items = lpt_order(work_items, predicted)
+
+    if args.http:
+        from .http_export import run_http_exports
+
+        fallback_items = run_http_exports(work_items, start_date_str, end_date_str, args.http_concurrency,
+                                          catalog_option_values(catalog), windows, results,
+                                          build_controller("HTTP exports", args.http_concurrency, adaptive))
+        if fallback_items:
+            logger.info(f"Falling back to the browser for {len(fallback_items)} items.")
+            run_session_items(fallback_items, start_date_str, end_date_str, results, windows, args.tabs, adaptive)
+        refetch_gaps(work_items, start_date_str, end_date_str, results, args.tabs, adaptive)
+        browser.quit_driver()
+    elif args.workers == 1:
+        run_session_items(work_items, start_date_str, end_date_str, results, windows, args.tabs, adaptive)
+        refetch_gaps(work_items, start_date_str, end_date_str, results, args.tabs, adaptive)
+        browser.quit_driver()
+    else:
+        if browser.driver is not None:
+            browser.quit_driver()
+        run_worker_pool(work_items, args.workers, start_date_str, end_date_str, windows, results, args.tabs, adaptive,
+                        predicted)
+
+    browser.shutdown_standby()
+    if not args.http:
+        log_finish(predicted_seconds, started_at)
+
+    if results["rediscovered"]:
+        apply_rediscoveries(catalog, results["rediscovered"])
+        save_catalog(catalog)
+
+    results["waits"].extend(browser.wait_timings)
+    results["sessions"].extend(browser.session_stats)
+    results["spans"].extend(metrics.step_spans)
+    record_durations(results["spans"])
+    metrics.write_prometheus_metrics(results["spans"])
+    log_summary(network_names, results)
+    logger.info("Driver quit. Script finished.")
+    return results
@@ -0,0 +1,108 @@
+import heapq
+import statistics
+from datetime import datetime, timedelta
+
+from .config import logger
+from .state import get_manifest
+
+# ---------------------------------------------------------------------------
+# Duration-aware scheduling. The manifest keeps a smoothed duration per
+# measurement point, updated from the "item" spans of every run (except the
+# gap re-fetch pass, whose windows are only a few days long). Work is then
+# ordered longest-processing-time first (LPT) and, for the worker pool, each
+# item goes to the shard with the least predicted work so far. Points without
+# history are predicted at the median of the known ones. The plan is logged
+# with its predicted finish time and the theoretical minimum, and compared
+# with the actual finish at the end of the run.
+DURATION_SMOOTHING = 0.5
+
+def get_durations_table():
+    conn = get_manifest()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS durations ("
+        " network TEXT NOT NULL, measurement_point TEXT NOT NULL,"
+        " seconds REAL NOT NULL, samples INTEGER NOT NULL, updated_at TEXT NOT NULL,"
+        " PRIMARY KEY (network, measurement_point))"
+    )
+    return conn
+
+def load_durations():
+    rows = get_durations_table().execute("SELECT network, measurement_point, seconds FROM durations")
+    return {(network, measurement_point): seconds for network, measurement_point, seconds in rows}
+
+def record_durations(spans):
+    durations = load_durations()
+    updated_at = datetime.now().isoformat(timespec="seconds")
+    conn = get_durations_table()
+    with conn:
+        for span in spans:
+            # Gap re-fetches cover a few days, not a full window.
+            if span["step"] != "item" or span["status"] != "ok" or span.get("phase") == "refetch":
+                continue
+            item = (span["network"], span["measurement_point"])
+            previous = durations.get(item)
+            seconds = span["seconds"] if previous is None else (
+                DURATION_SMOOTHING * span["seconds"] + (1 - DURATION_SMOOTHING) * previous)
+            durations[item] = seconds
+            conn.execute(
+                "INSERT INTO durations VALUES (?, ?, ?, 1, ?)"
+                " ON CONFLICT (network, measurement_point) DO UPDATE SET"
+                " seconds = excluded.seconds, samples = samples + 1, updated_at = excluded.updated_at",
+                (item[0], item[1], seconds, updated_at)
+            )
+
+# Predicted seconds per work item, or {} when there is no history at all.
+def predict_durations(work_items, durations):
+    known = [durations[item] for item in work_items if item in durations]
+    if not known:
+        return {}
+    default = statistics.median(known)
+    return {item: durations.get(item, default) for item in work_items}
+
+def lpt_order(work_items, predicted):
+    return sorted(work_items, key=lambda item: predicted[item], reverse=True)
+
+# Greedy LPT assignment to num_shards shards; returns the shards and their
+# predicted loads.
+def lpt_shards(work_items, predicted, num_shards):
+    shards = [[] for _ in range(min(num_shards, len(work_items)))]
+    loads = [(0.0, i) for i in range(len(shards))]
+    for item in lpt_order(work_items, predicted):
+        load, i = heapq.heappop(loads)
+        shards[i].append(item)
+        heapq.heappush(loads, (load + predicted[item], i))
+    totals = [0.0] * len(shards)
+    for load, i in loads:
+        totals[i] = load
+    return shards, totals
+
+# Predicted makespan of list-scheduling the items in order on `slots` parallel
+# slots, and the lower bound no schedule can beat.
+def predicted_makespan(ordered_items, predicted, slots):
+    if not ordered_items:
+        return 0.0, 0.0
+    finish = [0.0] * max(1, min(slots, len(ordered_items)))
+    for item in ordered_items:
+        heapq.heapreplace(finish, finish[0] + predicted[item])
+    total = sum(predicted[item] for item in ordered_items)
+    return max(finish), max(total / len(finish), max(predicted[item] for item in ordered_items))
+
+def log_plan(work_items, predicted, slots, started_at):
+    if not predicted:
+        logger.info("No duration history yet; using the catalog order.")
+        return None
+    makespan, lower_bound = predicted_makespan(lpt_order(work_items, predicted), predicted, slots)
+    slowest = lpt_order(work_items, predicted)[:3]
+    logger.info(f"LPT schedule of {len(work_items)} items on {slots} slots: predicted finish "
+                f"{(started_at + timedelta(seconds=makespan)).strftime('%H:%M:%S')} ({makespan / 60:.1f} min, "
+                f"theoretical minimum {lower_bound / 60:.1f} min). Slowest: "
+                + ", ".join(f"{mp} ({predicted[(network, mp)]:.0f}s)" for network, mp in slowest))
+    return makespan
+
+def log_finish(predicted_seconds, started_at):
+    actual = (datetime.now() - started_at).total_seconds()
+    if predicted_seconds is None:
+        logger.info(f"Items finished in {actual / 60:.1f} min.")
+        return
+    logger.info(f"Items finished at {datetime.now().strftime('%H:%M:%S')} after {actual / 60:.1f} min; "
+                f"predicted {predicted_seconds / 60:.1f} min ({actual - predicted_seconds:+.0f}s).")
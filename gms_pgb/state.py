@@ -0,0 +1,408 @@
+import os
+import json
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from .config import (state_dir, logger, malaysia_tz, month_folder_of, parse_portal_date, format_portal_date,
+                     format_measurement_point_name)
+from .workbooks import store_workbook, scan_export
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; stores are not locked there
+    fcntl = None
+
+# ---------------------------------------------------------------------------
+# Checkpoint manifest of finished items, keyed by network, measurement point
+# and date range. Each entry is committed right after its file is moved into
+# place, so a killed run can pick up where it stopped with --resume.
+manifest_path = os.path.join(state_dir, "manifest.sqlite")
+manifest_conn = None
+
+def get_manifest():
+    global manifest_conn
+    if manifest_conn is None:
+        os.makedirs(state_dir, exist_ok=True)
+        manifest_conn = sqlite3.connect(manifest_path, timeout=60)
+        manifest_conn.execute("PRAGMA journal_mode=WAL")
+        manifest_conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " network TEXT NOT NULL, measurement_point TEXT NOT NULL,"
+            " start_date TEXT NOT NULL, end_date TEXT NOT NULL,"
+            " status TEXT NOT NULL, file_path TEXT, size INTEGER, sha256 TEXT,"
+            " updated_at TEXT NOT NULL,"
+            " PRIMARY KEY (network, measurement_point, start_date, end_date))"
+        )
+    return manifest_conn
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def record_item(network, measurement_point, start_date_str, end_date_str, status, file_path=None):
+    size = sha256 = None
+    if file_path:
+        size = os.path.getsize(file_path)
+        sha256 = file_sha256(file_path)
+    conn = get_manifest()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (network, measurement_point, start_date_str, end_date_str, status,
+             file_path, size, sha256, datetime.now().isoformat(timespec="seconds"))
+        )
+
+# Items already downloaded for a window ending on end_date_str whose file is
+# still in place, or found to have no data for it, as (network, measurement
+# point) keys. The window start is left out on purpose: storing an item moves
+# its incremental window forward, so a resumed run asks for a later start
+# than the one the finished item was recorded with.
+def completed_items(end_date_str):
+    rows = get_manifest().execute(
+        "SELECT network, measurement_point, status, file_path, size FROM items"
+        " WHERE status IN ('done', 'no_data') AND end_date = ?",
+        (end_date_str,)
+    )
+    return {
+        (network, measurement_point)
+        for network, measurement_point, status, file_path, size in rows
+        if status == "no_data" or (file_path and os.path.exists(file_path) and os.path.getsize(file_path) == size)
+    }
+
+def filter_completed(work_items, completed, results):
+    remaining = []
+    for network, measurement_point in work_items:
+        if (network, measurement_point) in completed:
+            results["resumed"].append(f"{network} - {measurement_point}")
+        else:
+            remaining.append((network, measurement_point))
+    return remaining
+
+# ---------------------------------------------------------------------------
+# Incremental fetching. The manifest also tracks, per measurement point and
+# month, the last gas day that is fully covered by the month-to-date workbook.
+# Later runs request only the days after it and merge the new rows into that
+# workbook; --full-month re-pulls from the 1st.
+# The current gas day is still filling up, so it never counts as covered (or
+# as missing); yesterday is the last complete one.
+def last_complete_day():
+    return datetime.now(malaysia_tz).date() - timedelta(days=1)
+
+def get_coverage():
+    conn = get_manifest()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS coverage ("
+        " network TEXT NOT NULL, measurement_point TEXT NOT NULL, month TEXT NOT NULL,"
+        " covered_through TEXT NOT NULL,"
+        " PRIMARY KEY (network, measurement_point, month))"
+    )
+    return conn
+
+def covered_through(network, measurement_point, month):
+    row = get_coverage().execute(
+        "SELECT covered_through FROM coverage WHERE network = ? AND measurement_point = ? AND month = ?",
+        (network, measurement_point, month)
+    ).fetchone()
+    return date.fromisoformat(row[0]) if row else None
+
+# Coverage only grows over contiguous days: a window that does not start on
+# the 1st extends it only when it starts right after the covered days (backfill
+# windows can finish out of order), and only up to the day before the first
+# gap of its export, so the next incremental window starts at the gap.
+def update_coverage(network, measurement_point, start_date_str, end_date_str, gaps=()):
+    yesterday = last_complete_day()
+    window_start = parse_portal_date(start_date_str)
+    month = window_start.strftime("%Y-%m")
+    covered = min(parse_portal_date(end_date_str), yesterday)
+    if gaps:
+        covered = min(covered, gaps[0][0] - timedelta(days=1))
+    if covered < window_start:
+        return
+    previous = covered_through(network, measurement_point, month)
+    if window_start.day != 1 and (previous is None or previous < window_start - timedelta(days=1)):
+        return
+    if previous is not None:
+        covered = max(covered, previous)
+    conn = get_coverage()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+            (network, measurement_point, month, covered.isoformat())
+        )
+
+def clear_coverage(network, measurement_point, start_date_str):
+    conn = get_coverage()
+    with conn:
+        conn.execute(
+            "DELETE FROM coverage WHERE network = ? AND measurement_point = ? AND month = ?",
+            (network, measurement_point, parse_portal_date(start_date_str).strftime("%Y-%m"))
+        )
+
+# Window start per work item, for items whose month-to-date workbook already
+# covers part of the month. Items not in the result use the full window.
+def plan_incremental_windows(work_items, start_date_str, end_date_str):
+    try:
+        import openpyxl  # noqa: F401 -- needed to merge the new rows
+    except ImportError:
+        logger.warning("openpyxl is not installed; fetching the full month for every item.")
+        return {}
+    month_start = parse_portal_date(start_date_str)
+    end_date = parse_portal_date(end_date_str)
+    rows = get_coverage().execute(
+        "SELECT network, measurement_point, covered_through FROM coverage WHERE month = ?",
+        (month_start.strftime("%Y-%m"),)
+    )
+    coverage = {(network, measurement_point): covered for network, measurement_point, covered in rows}
+    windows = {}
+    for network, measurement_point in work_items:
+        covered = coverage.get((network, measurement_point))
+        dataset_path = os.path.join(month_folder_of(month_start), format_measurement_point_name(measurement_point))
+        if not covered or not os.path.exists(dataset_path):
+            continue
+        window_start = min(date.fromisoformat(covered) + timedelta(days=1), end_date)
+        if window_start > month_start:
+            windows[(network, measurement_point)] = format_portal_date(window_start)
+    return windows
+
+# Incremental windows for the run, logged per item; --full-month disables them.
+def plan_windows(work_items, start_date_str, end_date_str, full_month):
+    if full_month:
+        return {}
+    windows = plan_incremental_windows(work_items, start_date_str, end_date_str)
+    for (network, measurement_point), item_start in windows.items():
+        logger.info(f"Incremental window for '{measurement_point}' of network '{network}': {item_start} - {end_date_str}")
+    return windows
+
+# ---------------------------------------------------------------------------
+# Put a downloaded export in place as the month-to-date workbook of its
+# measurement point, in the folder of the month its window starts in. A
+# workbook whose data rows did not change is left as it is, so the artifact
+# reuses its entry. Every export is validated first. Returns the number of
+# changed rows, or None when the export was rejected.
+def store_download(network, measurement_point, source_path, start_date_str, end_date_str):
+    window_start = parse_portal_date(start_date_str)
+    month_dir = month_folder_of(window_start)
+    new_file_path = os.path.join(month_dir, format_measurement_point_name(measurement_point))
+    os.makedirs(month_dir, exist_ok=True)
+    window_end = parse_portal_date(end_date_str)
+    try:
+        gaps = validate_export(network, measurement_point, source_path, window_start, window_end)
+    except Exception as e:
+        gaps = None
+        logger.error(f"Export of '{measurement_point}' for {start_date_str} - {end_date_str} is unreadable: {e}")
+    if gaps is None:
+        # Nothing usable: keep the workbook as it is and fetch the window again.
+        os.remove(source_path)
+        record_item(network, measurement_point, start_date_str, end_date_str, "failed")
+        yesterday = last_complete_day()
+        gaps = [(window_start, min(window_end, yesterday))] if window_start <= yesterday else []
+        record_gaps(network, measurement_point, window_start, window_end, gaps)
+        return None
+    with store_lock():
+        if window_start.day != 1 and not os.path.exists(new_file_path) \
+                and covered_through(network, measurement_point, window_start.strftime("%Y-%m")):
+            # The month-to-date workbook vanished mid-run: keep the partial
+            # export, but make the next run fetch the whole month again.
+            logger.warning(f"No month-to-date workbook for '{measurement_point}'; stored the partial window only.")
+            clear_coverage(network, measurement_point, start_date_str)
+        changes = store_workbook(new_file_path, source_path, window_start, window_end)
+        update_coverage(network, measurement_point, start_date_str, end_date_str, gaps)
+        record_item(network, measurement_point, start_date_str, end_date_str, "done", new_file_path)
+        record_changes(month_dir, network, measurement_point, changes)
+    record_gaps(network, measurement_point, window_start, window_end, gaps)
+    return len(changes)
+
+# Workers and backfill windows may store into the same workbook at the same
+# time; the read-merge-write of a workbook is serialized with a lock file.
+@contextmanager
+def store_lock():
+    os.makedirs(state_dir, exist_ok=True)
+    with open(os.path.join(state_dir, "store.lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# ---------------------------------------------------------------------------
+# Row-level change log. Every run appends the rows that were added, changed
+# or removed to changes/<date>.jsonl in the month folder, one JSON object per
+# row, so the history of a month grows with the data that actually changed
+# rather than with a copy of every workbook per day.
+def json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+def record_changes(month_dir, network, measurement_point, changes):
+    if not changes:
+        return
+    recorded_at = datetime.now().isoformat(timespec="seconds")
+    lines = "".join(
+        json.dumps({"network": network, "measurement_point": measurement_point, "gas_day": day.isoformat(),
+                    "change": change, "row": list(row), "recorded_at": recorded_at},
+                   ensure_ascii=False, default=json_value) + "\n"
+        for change, day, row in changes
+    )
+    changes_dir = os.path.join(month_dir, "changes")
+    os.makedirs(changes_dir, exist_ok=True)
+    # One write per item, so that workers appending at the same time do not
+    # interleave their lines.
+    with open(os.path.join(changes_dir, f"{date.today().isoformat()}.jsonl"), "a", encoding="utf-8") as f:
+        f.write(lines)
+
+# Sort a stored export into the run's results; the serial loop, the tab
+# pipeline and the HTTP exports all go through here.
+def note_stored(results, network, measurement_point, changed_rows):
+    if changed_rows is None:
+        results["invalid"].append(f"{network} - {measurement_point}")
+        return
+    results["downloaded"].append(f"{measurement_point}")
+    results["changed" if changed_rows else "unchanged"].append(f"{network} - {measurement_point}")
+
+# ---------------------------------------------------------------------------
+# Export validation. Each export is streamed once before it is stored and
+# checked for the gas days of its window (through yesterday; today is still
+# filling up), rows outside the window, exact duplicate rows and a column
+# header that differs from the last one seen for the measurement point. An
+# unreadable export, or one without a single day of its window, is rejected.
+# Missing days are kept in the gaps table and re-fetched as narrow windows at
+# the end of the pass, at most MAX_GAP_REFETCHES times.
+MAX_GAP_REFETCHES = 2
+
+def get_validation_tables():
+    conn = get_manifest()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS gaps ("
+        " network TEXT NOT NULL, measurement_point TEXT NOT NULL,"
+        " start_date TEXT NOT NULL, end_date TEXT NOT NULL, refetches INTEGER NOT NULL,"
+        " updated_at TEXT NOT NULL,"
+        " PRIMARY KEY (network, measurement_point, start_date, end_date))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schemas ("
+        " network TEXT NOT NULL, measurement_point TEXT NOT NULL, header TEXT NOT NULL,"
+        " updated_at TEXT NOT NULL,"
+        " PRIMARY KEY (network, measurement_point))"
+    )
+    return conn
+
+def header_names(header):
+    names = [str(cell).strip() if cell is not None else None for cell in header or ()]
+    while names and names[-1] is None:
+        names.pop()
+    return names
+
+def missing_ranges(days, window_start, window_end):
+    ranges, day = [], window_start
+    while day <= window_end:
+        if day not in days:
+            if ranges and ranges[-1][1] == day - timedelta(days=1):
+                ranges[-1] = (ranges[-1][0], day)
+            else:
+                ranges.append((day, day))
+        day += timedelta(days=1)
+    return ranges
+
+# Gap ranges of an export as (first day, last day) pairs, or None when the
+# export has none of its window's days. Problems are logged as warnings.
+def validate_export(network, measurement_point, path, window_start, window_end):
+    header, days, duplicates = scan_export(path)
+    label = f"'{measurement_point}' ({format_portal_date(window_start)} - {format_portal_date(window_end)})"
+    yesterday = last_complete_day()
+    inside = [day for day in days if window_start <= day <= window_end]
+    outside = len(days) - len(inside)
+    if outside:
+        logger.warning(f"Export of {label} has rows for {outside} days outside the requested window.")
+    if not inside:
+        if days:
+            logger.error(f"Export of {label} covers a different date range.")
+        else:
+            logger.error(f"Export of {label} has no rows.")
+        return None
+    if duplicates:
+        logger.warning(f"Export of {label} has {duplicates} duplicate rows.")
+    names = header_names(header)
+    conn = get_validation_tables()
+    row = conn.execute("SELECT header FROM schemas WHERE network = ? AND measurement_point = ?",
+                       (network, measurement_point)).fetchone()
+    if names and row and json.loads(row[0]) != names:
+        logger.warning(f"Columns of {label} changed from {json.loads(row[0])} to {names}.")
+    if names and (row is None or json.loads(row[0]) != names):
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO schemas VALUES (?, ?, ?, ?)",
+                         (network, measurement_point, json.dumps(names, ensure_ascii=False),
+                          datetime.now().isoformat(timespec="seconds")))
+    gaps = missing_ranges(days, window_start, min(window_end, yesterday))
+    if gaps:
+        logger.warning(f"Export of {label} is missing " + ", ".join(
+            format_portal_date(first) if first == last else f"{format_portal_date(first)} - {format_portal_date(last)}"
+            for first, last in gaps))
+    return gaps
+
+# Replace the gaps recorded inside a window by the ones found in its latest
+# export; a gap that survives a re-fetch counts one more attempt.
+def record_gaps(network, measurement_point, window_start, window_end, gaps):
+    conn = get_validation_tables()
+    rows = conn.execute(
+        "SELECT start_date, end_date, refetches FROM gaps WHERE network = ? AND measurement_point = ?",
+        (network, measurement_point)
+    ).fetchall()
+    inside = [(start, end, refetches) for start, end, refetches in rows
+              if window_start <= date.fromisoformat(start) and date.fromisoformat(end) <= window_end]
+    if not inside and not gaps:
+        return
+    refetches = max((r for _, _, r in inside), default=-1) + 1
+    updated_at = datetime.now().isoformat(timespec="seconds")
+    with conn:
+        conn.executemany(
+            "DELETE FROM gaps WHERE network = ? AND measurement_point = ? AND start_date = ? AND end_date = ?",
+            [(network, measurement_point, start, end) for start, end, _ in inside]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO gaps VALUES (?, ?, ?, ?, ?, ?)",
+            [(network, measurement_point, first.isoformat(), last.isoformat(), refetches, updated_at)
+             for first, last in gaps]
+        )
+
+# Gaps of the given items between start_date_str and end_date_str that are
+# still worth a re-fetch, as (network, measurement point, start, end) in
+# portal date strings.
+def pending_gaps(work_items, start_date_str, end_date_str):
+    items = set(work_items)
+    first, last = parse_portal_date(start_date_str).isoformat(), parse_portal_date(end_date_str).isoformat()
+    rows = get_validation_tables().execute(
+        "SELECT network, measurement_point, start_date, end_date FROM gaps"
+        " WHERE refetches < ? AND start_date >= ? AND end_date <= ? ORDER BY start_date",
+        (MAX_GAP_REFETCHES, first, last)
+    )
+    return [
+        (network, measurement_point, format_portal_date(date.fromisoformat(start)),
+         format_portal_date(date.fromisoformat(end)))
+        for network, measurement_point, start, end in rows
+        if (network, measurement_point) in items
+    ]
+
+# A search that found no rows for the window: nothing is exported or stored,
+# and the item is checkpointed as "no_data" rather than as a failure. A
+# re-fetch that finds nothing still counts against the gaps it was for.
+def record_no_data(results, network, measurement_point, start_date_str, end_date_str):
+    logger.info(f"No data for measurement point '{measurement_point}' of network '{network}' "
+                f"({start_date_str} - {end_date_str}); skipping the export.")
+    results["no_data"].append(f"{network} - {measurement_point}")
+    record_item(network, measurement_point, start_date_str, end_date_str, "no_data")
+    conn = get_validation_tables()
+    with conn:
+        conn.execute(
+            "UPDATE gaps SET refetches = refetches + 1, updated_at = ?"
+            " WHERE network = ? AND measurement_point = ? AND start_date >= ? AND end_date <= ?",
+            (datetime.now().isoformat(timespec="seconds"), network, measurement_point,
+             parse_portal_date(start_date_str).isoformat(), parse_portal_date(end_date_str).isoformat())
+        )
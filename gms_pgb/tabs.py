@@ -0,0 +1,354 @@
+import os
+import time
+from collections import deque
+
+from selenium.common.exceptions import WebDriverException
+
+from . import browser, config
+from .config import logger
+from .metrics import timed_step, start_span, finish_span
+from .downloads import DownloadWatcher, release_download
+from .state import record_item, store_download, note_stored, record_no_data
+from .watchdog import BrowserWatchdog
+from .retry import ItemRetries, DOWNLOAD_START_TIMEOUT, record_give_up
+
+# ---------------------------------------------------------------------------
+# Tab pipelining (--tabs N). One logged-in Chrome session keeps N tabs on the
+# PGB Daily Gas Movement page and the scheduler below cycles through them:
+# an idle tab selects its next measurement point and starts the search, a
+# searching tab waits for the grid of its own search, a loaded tab exports
+# and a downloading tab is checked for its file. The server-side searches of all
+# tabs overlap; exports go one at a time so that every download is tied to
+# the export click that started it. A search that comes back empty finishes
+# its item as no-data without exporting. When the watchdog asks for a browser
+# restart, no new items start until every tab is idle. A failed item goes
+# back to the end of the queue, and is not started again before its
+# backoff has passed, as the retry policy says.
+SEARCH_TIMEOUT = 300
+EXPORT_BUTTON_TIMEOUT = 5
+DOWNLOAD_TIMEOUT = 120
+
+class Tab:
+    def __init__(self, handle, network=None):
+        self.handle = handle
+        self.network = network  # network selected on this tab's page
+        self.reset()
+
+    def reset(self):
+        self.item = None
+        self.item_start = None
+        self.state = "idle"
+        self.deadline = 0
+        self.start_deadline = 0
+        self.item_span = None
+        self.step_span = None
+        self.watcher = None
+        self.previous_rows = ()  # grid rows from before the search click
+        self.search_started = False
+
+class TabPipeline:
+    def __init__(self, work_items, num_tabs, start_date_str, end_date_str, results, windows, controller=None):
+        self.queue = deque(work_items)
+        self.controller = controller  # caps the tabs that have an item in flight
+        self.num_tabs = num_tabs
+        self.start_date_str = start_date_str
+        self.end_date_str = end_date_str
+        self.results = results
+        self.windows = windows or {}
+        self.retries = {}
+        self.not_before = {}
+        self.rediscovered = set()
+        self.downloading = None
+        self.tabs = []
+        self.watchdog = BrowserWatchdog()
+        self.recycle_reason = None
+
+    def open_tabs(self, network=None):
+        first = Tab(browser.driver.current_window_handle, network)
+        self.tabs = [first]
+        for _ in range(self.num_tabs - 1):
+            self.tabs.append(Tab(browser.open_tab()))
+        logger.info(f"Pipelining {len(self.queue)} items across {len(self.tabs)} tabs.")
+
+    def run(self):
+        self.open_tabs()
+        try:
+            while self.queue or any(tab.state != "idle" for tab in self.tabs):
+                if self.recycle_reason and all(tab.state == "idle" for tab in self.tabs):
+                    self.recycle()
+                progressed = False
+                for tab in list(self.tabs):
+                    try:
+                        progressed |= self.step(tab)
+                    except WebDriverException as e:
+                        self.recover(tab, e)
+                        progressed = True
+                        break
+                if not progressed:
+                    self.idle_wait()
+            if self.controller:
+                self.controller.log_summary()
+        finally:
+            self.close_tabs()
+
+    # Close the extra tabs, also when the pipeline stops on an error, so the
+    # session is left on its first tab.
+    def close_tabs(self):
+        try:
+            for tab in self.tabs[1:]:
+                browser.driver.switch_to.window(tab.handle)
+                browser.driver.close()
+            browser.driver.switch_to.window(self.tabs[0].handle)
+        except WebDriverException as e:
+            logger.warning(f"Could not close the extra tabs: {e}")
+        for tab in self.tabs:
+            if tab.watcher is not None:
+                tab.watcher.close()
+
+    # Wait one poll interval; with a download in flight, wake up on its file.
+    def idle_wait(self):
+        if self.downloading is not None:
+            self.downloading.watcher.collect(config.poll_interval)
+        else:
+            time.sleep(config.poll_interval)
+
+    # Advance one tab by at most one state. Returns True when it did something.
+    def step(self, tab):
+        if tab.state == "idle":
+            if not self.queue or not self.may_start():
+                return False
+            item = self.next_ready()
+            if item is None:
+                return False
+            browser.driver.switch_to.window(tab.handle)
+            self.start_item(tab, item)
+            return True
+        if tab.state == "searching":
+            browser.driver.switch_to.window(tab.handle)
+            tab.search_started = tab.search_started or browser.search_started(tab.previous_rows)(browser.driver)
+            if tab.search_started and browser.grid_rendered(browser.driver):
+                empty = browser.search_result_empty()
+                finish_span(tab.step_span, "no_data" if empty else None)
+                self.observe("search", tab.step_span["seconds"])
+                if empty:
+                    network, measurement_point = tab.item
+                    record_no_data(self.results, network, measurement_point, tab.item_start, self.end_date_str)
+                    self.finish_item(tab, "no_data")
+                else:
+                    tab.state = "loaded"
+            elif time.monotonic() > tab.deadline:
+                network, measurement_point = tab.item
+                logger.warning(f"Timeout waiting for page to load for network '{network}'.")
+                finish_span(tab.step_span, "timeout")
+                self.observe("search", tab.step_span["seconds"], "timed out")
+                self.fail(tab, "portal_timeout", "the search results did not load")
+            else:
+                return False
+            return True
+        if tab.state == "loaded":
+            if self.downloading is not None:
+                return False
+            browser.driver.switch_to.window(tab.handle)
+            self.export(tab)
+            return True
+        if tab.state == "downloading":
+            downloaded_file = tab.watcher.claim()
+            if downloaded_file:
+                self.store(tab, downloaded_file)
+                return True
+            now = time.monotonic()
+            if now > tab.deadline or (not tab.watcher.started and now > tab.start_deadline):
+                network, measurement_point = tab.item
+                logger.info(f"No file downloaded for measurement point '{measurement_point}' of network '{network}'.")
+                finish_span(tab.step_span, "missing")
+                self.observe("download", tab.step_span["seconds"], "missing")
+                self.fail(tab, "download_missing", "no file was downloaded" if tab.watcher.started
+                          else "the export click started no download")
+                return True
+            tab.watcher.collect(0)
+            return False
+        return False
+
+    def may_start(self):
+        if self.recycle_reason:
+            return False
+        if self.controller is None:
+            return True
+        return sum(tab.state != "idle" for tab in self.tabs) < self.controller.allowed
+
+    def observe(self, kind, seconds, failure=None):
+        if self.controller:
+            self.controller.observe(kind, seconds, failure)
+
+    # The first queued item whose backoff has passed.
+    def next_ready(self):
+        now = time.monotonic()
+        for item in self.queue:
+            if self.not_before.get(item, 0) <= now:
+                self.queue.remove(item)
+                return item
+        return None
+
+    def start_item(self, tab, item):
+        network, measurement_point = item
+        tab.item = item
+        tab.item_start = self.windows.get(item, self.start_date_str)
+        tab.item_span = start_span("item", network, measurement_point)
+        if item not in self.retries:
+            self.retries[item] = ItemRetries(network, measurement_point)
+        logger.info(f"Processing measurement point: {measurement_point} for network: {network} (tab {self.tabs.index(tab) + 1})")
+        if tab.network != network:
+            with timed_step("select_network", network) as span:
+                selected = browser.select_dropdown(1, network)
+                if selected:
+                    browser.wait_for("measurement points reloaded", browser.dropdown_idle(2))
+                else:
+                    span["status"] = "not_selected"
+            if not selected:
+                tab.network = None
+                self.fail(tab, "selection", f"network '{network}' could not be selected")
+                return
+            tab.network = network
+        with timed_step("select_measurement_point", network, measurement_point) as span:
+            selected = browser.select_dropdown(2, measurement_point)
+            if not selected:
+                span["status"] = "not_selected"
+        if not selected:
+            self.missing_point(tab)
+            return
+        browser.set_date_input(tab.item_start, start=True)
+        browser.set_date_input(self.end_date_str, start=False)
+        tab.step_span = start_span("search", network, measurement_point)
+        tab.previous_rows = browser.click_search()
+        tab.state = "searching"
+        tab.deadline = time.monotonic() + self.retries[item].remaining(SEARCH_TIMEOUT)
+
+    def export(self, tab):
+        network, measurement_point = tab.item
+        tab.watcher = DownloadWatcher(browser.driver_download_dir)
+        with timed_step("export_click", network, measurement_point) as span:
+            exported = browser.click_export_button(timeout=EXPORT_BUTTON_TIMEOUT)
+            if not exported:
+                span["status"] = "missing"
+        if not exported:
+            self.observe("export", span["seconds"], "button missing")
+            self.fail(tab, "export_missing", "no export button")
+            return
+        tab.step_span = start_span("download", network, measurement_point)
+        tab.state = "downloading"
+        now = time.monotonic()
+        tab.deadline = now + self.retries[tab.item].remaining(DOWNLOAD_TIMEOUT)
+        tab.start_deadline = now + DOWNLOAD_START_TIMEOUT
+        self.downloading = tab
+
+    def store(self, tab, downloaded_file):
+        network, measurement_point = tab.item
+        logger.info(f"Detected downloaded file: {downloaded_file}")
+        finish_span(tab.step_span)
+        self.observe("download", tab.step_span["seconds"])
+        try:
+            with timed_step("store", network, measurement_point):
+                changed_rows = store_download(network, measurement_point, downloaded_file, tab.item_start,
+                                              self.end_date_str)
+        except Exception as e:
+            # A bad workbook or merge error ends this item only, not the pipeline.
+            logger.error(f"Storing the export of measurement point '{measurement_point}' of network '{network}' "
+                         f"failed: {e}. Skipping this combination.")
+            if os.path.exists(downloaded_file):
+                os.remove(downloaded_file)
+            release_download(downloaded_file)
+            self.finish_item(tab, "skipped", "error")
+            return
+        release_download(downloaded_file)
+        note_stored(self.results, network, measurement_point, changed_rows)
+        self.finish_item(tab, "stored")
+
+    # A failed attempt: back to the queue after its backoff, or given up.
+    def fail(self, tab, failure, message):
+        item = tab.item
+        network, measurement_point = item
+        if tab.step_span is not None and "start" in tab.step_span:
+            finish_span(tab.step_span, "error")
+        delay = self.retries[item].retry_after(failure, message)
+        if delay is None:
+            record_give_up(self.results, network, measurement_point, tab.item_start, self.end_date_str, failure)
+            self.finish_item(tab, "failed", failure)
+            return
+        finish_span(tab.item_span, failure)
+        self.release_tab(tab)
+        self.not_before[item] = time.monotonic() + delay
+        self.queue.append(item)
+
+    def finish_item(self, tab, outcome, status="ok"):
+        network, measurement_point = tab.item
+        if outcome == "skipped":
+            self.results["skipped"].append(f"{network} - {measurement_point}")
+            record_item(network, measurement_point, tab.item_start, self.end_date_str, "failed")
+        if tab.item_span is not None and "start" in tab.item_span:
+            finish_span(tab.item_span, status)
+        self.release_tab(tab)
+        if not self.recycle_reason:
+            self.recycle_reason = self.watchdog.check(measurement_point)
+
+    def recycle(self):
+        reason, self.recycle_reason = self.recycle_reason, None
+        for tab in self.tabs:
+            self.release_tab(tab)
+        self.watchdog.recycle(reason)
+        self.open_tabs()
+
+    def release_tab(self, tab):
+        if tab.watcher is not None:
+            tab.watcher.close()
+        if self.downloading is tab:
+            self.downloading = None
+        network = tab.network
+        tab.reset()
+        tab.network = network
+
+    # The point could not be selected: re-discover its network once per run
+    # (in this tab), queue points that only show up now and retry the item.
+    # A point that is still missing counts as a selection failure.
+    def missing_point(self, tab):
+        network, measurement_point = tab.item
+        logger.warning(f"'{measurement_point}' is not in the dropdown of network '{network}'.")
+        if network not in self.rediscovered:
+            self.rediscovered.add(network)
+            logger.warning(f"Re-discovering measurement points for network '{network}'.")
+            measurement_point_names = browser.rediscover_network(network, self.results)
+            known = set(self.queue) | {t.item for t in self.tabs}
+            self.queue.extend((network, point) for point in measurement_point_names if (network, point) not in known)
+            if measurement_point in measurement_point_names:
+                item = tab.item
+                finish_span(tab.item_span, "not_selected")
+                self.release_tab(tab)
+                self.queue.appendleft(item)
+                return
+        self.fail(tab, "selection", f"'{measurement_point}' is not in the dropdown of network '{network}'")
+
+    # A WebDriver error while driving a tab: the item fails as a browser
+    # crash, then the tab is reloaded, or the browser is restarted and every
+    # tab reopened when the session itself is gone.
+    def recover(self, tab, error):
+        if tab.item is not None:
+            network, measurement_point = tab.item
+            logger.warning(f"WebDriverException for measurement point '{measurement_point}' of network '{network}': {error}")
+            self.fail(tab, "browser_crash", getattr(error, "msg", None) or str(error))
+        if browser.browser_alive():
+            try:
+                browser.driver.switch_to.window(tab.handle)
+                browser.reload_tab()
+                tab.network = None
+                return
+            except WebDriverException as e:
+                logger.warning(f"Reloading tab failed ({e}); restarting the browser.")
+        # Requeue everything in flight and start over in a new session.
+        for other in self.tabs:
+            if other.item is not None:
+                finish_span(other.item_span, "error")
+                if other.step_span is not None and "start" in other.step_span:
+                    finish_span(other.step_span, "error")
+                self.queue.appendleft(other.item)
+            self.release_tab(other)
+        browser.reinitialize_driver()
+        self.open_tabs()
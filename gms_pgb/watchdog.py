@@ -0,0 +1,78 @@
+from selenium.common.exceptions import WebDriverException
+
+from . import browser, metrics
+from .config import env_number
+
+# ---------------------------------------------------------------------------
+# Proactive browser recycling. Long sessions on the Kendo page leak memory
+# and get slower, and waiting for Chrome to crash costs a failed attempt. The
+# watchdog is checked after every item and asks for a restart, taken between
+# items, once any of these is reached (0 disables a limit):
+#   GMS_RECYCLE_RSS_MIB         browser RSS (chromedriver and all of Chrome)
+#   GMS_RECYCLE_DOM_NODES       element count of the current page
+#   GMS_RECYCLE_EXPORTS         items handled by one browser session
+#   GMS_RECYCLE_LATENCY_FACTOR  smoothed measurement point selection time
+#                               against the fastest seen in the session
+# Selecting a measurement point is pure client-side work, so its time follows
+# the browser's health rather than the portal's load or the size of the data.
+EWMA_ALPHA = 0.3
+LATENCY_WARMUP = 5
+MIN_LATENCY_RISE = 0.5
+
+class BrowserWatchdog:
+    def __init__(self):
+        self.max_rss = env_number("GMS_RECYCLE_RSS_MIB", 1536) * 2 ** 20
+        self.max_dom_nodes = env_number("GMS_RECYCLE_DOM_NODES", 50000)
+        self.max_items = env_number("GMS_RECYCLE_EXPORTS", 200)
+        self.latency_factor = env_number("GMS_RECYCLE_LATENCY_FACTOR", 3.0)
+        self.reset()
+
+    # A fresh browser session starts with fresh figures.
+    def reset(self):
+        self.session = browser.driver
+        self.items = 0
+        self.samples = 0
+        self.smoothed = None
+        self.baseline = None
+
+    # One item finished in this session; returns why the browser should be
+    # recycled, or None.
+    def check(self, measurement_point):
+        if browser.driver is not self.session:
+            self.reset()  # restarted after a crash in the meantime
+        self.items += 1
+        self.observe_latency(measurement_point)
+        if self.max_items and self.items >= self.max_items:
+            return f"{self.items} items in this session"
+        if self.max_rss:
+            rss = browser.browser_rss(browser.driver)
+            if rss is not None and rss > self.max_rss:
+                return f"browser RSS {rss / 2 ** 20:.0f} MiB"
+        if self.max_dom_nodes:
+            try:
+                nodes = browser.driver.execute_script("return document.getElementsByTagName('*').length;")
+            except WebDriverException:
+                nodes = 0
+            if nodes > self.max_dom_nodes:
+                return f"{nodes} DOM nodes"
+        if (self.latency_factor and self.samples > LATENCY_WARMUP
+                and self.smoothed > self.baseline * self.latency_factor
+                and self.smoothed - self.baseline > MIN_LATENCY_RISE):
+            return f"selection latency {self.smoothed:.1f}s against {self.baseline:.1f}s at the start"
+        return None
+
+    def observe_latency(self, measurement_point):
+        with metrics.spans_lock:
+            span = next((s for s in reversed(metrics.step_spans[-20:])
+                         if s["step"] == "select_measurement_point" and s["measurement_point"] == measurement_point
+                         and s["status"] == "ok"), None)
+        if span is None:
+            return
+        seconds = span["seconds"]
+        self.samples += 1
+        self.smoothed = seconds if self.smoothed is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.smoothed
+        self.baseline = self.smoothed if self.baseline is None else min(self.baseline, self.smoothed)
+
+    def recycle(self, reason, network=None):
+        browser.reinitialize_driver(network, reason=reason)
+        self.reset()
@@ -0,0 +1,126 @@
+import os
+import shutil
+from datetime import date, datetime
+
+from .config import logger
+
+# ---------------------------------------------------------------------------
+# Workbook rows. openpyxl is imported only when a workbook is actually read
+# or written.
+def parse_row_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        for date_format in ("%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d", "%d-%m-%Y", "%d-%b-%Y"):
+            try:
+                return datetime.strptime(value.strip(), date_format).date()
+            except ValueError:
+                pass
+    return None
+
+# Split the first sheet into the rows above the data and the data rows, each
+# data row keyed by the first cell that holds a date. Rows after the data
+# (totals) are dropped because they no longer match the merged rows.
+def read_dated_rows(path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        header_rows, dated_rows = [], []
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            day = next((d for d in map(parse_row_date, row) if d), None)
+            if day:
+                dated_rows.append((day, row))
+            elif not dated_rows:
+                header_rows.append(row)
+        return header_rows, dated_rows
+    finally:
+        workbook.close()
+
+# Stream an export once for validation: the column header (the last non-empty
+# row above the data), the number of rows per gas day and the number of rows
+# that repeat an earlier row exactly. Only the days and row hashes are kept.
+def scan_export(path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        header, days, seen, duplicates = None, {}, set(), 0
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            day = next((d for d in map(parse_row_date, row) if d), None)
+            if day is None:
+                if not days and any(cell is not None for cell in row):
+                    header = tuple(row)
+                continue
+            days[day] = days.get(day, 0) + 1
+            row_hash = hash(row)
+            if row_hash in seen:
+                duplicates += 1
+            seen.add(row_hash)
+        return header, days, duplicates
+    finally:
+        workbook.close()
+
+# Row-level differences between two versions of a workbook's data rows, as
+# (change, gas day, row) tuples: "added" and "removed" days, and the new rows
+# of days whose rows are no longer the same. The rows above the data are left
+# out; they carry no data and may differ between exports of the same data.
+def diff_dated_rows(old_rows, new_rows):
+    old_days, new_days = {}, {}
+    for day, row in old_rows:
+        old_days.setdefault(day, []).append(row)
+    for day, row in new_rows:
+        new_days.setdefault(day, []).append(row)
+    changes = []
+    for day in sorted(set(old_days) | set(new_days)):
+        old, new = old_days.get(day), new_days.get(day)
+        if old == new:
+            continue
+        if old is None:
+            changes.extend(("added", day, row) for row in new)
+        elif new is None:
+            changes.extend(("removed", day, row) for row in old)
+        else:
+            changes.extend(("changed", day, row) for row in new)
+    return changes
+
+# Put an export of the days window_start to window_end into the month-to-date
+# workbook. An export from the 1st that holds every stored day is moved into
+# place as it is; any other export replaces only the rows of the days it has,
+# so backfill windows may arrive in any order. The workbook is only written
+# when that changes its data rows. Returns the row changes.
+def store_workbook(dataset_path, export_path, window_start, window_end):
+    import openpyxl
+
+    new_header, new_rows = read_dated_rows(export_path)
+    if not os.path.exists(dataset_path):
+        shutil.move(export_path, dataset_path)
+        logger.info(f"Renamed '{export_path}' to '{dataset_path}'")
+        return diff_dated_rows([], new_rows)
+    old_header, old_rows = read_dated_rows(dataset_path)
+    # Days the export lacks keep their old rows; validation re-fetches them.
+    new_days = {day for day, row in new_rows}
+    kept = [(day, row) for day, row in old_rows if day < window_start or day > window_end or day not in new_days]
+    merged = sorted(kept + new_rows, key=lambda dated_row: dated_row[0])
+    changes = diff_dated_rows(old_rows, merged)
+    if not changes:
+        os.remove(export_path)
+        logger.info(f"No new or changed rows for '{dataset_path}' ({len(merged)} rows month-to-date)")
+        return changes
+    if window_start.day == 1 and not kept:
+        shutil.move(export_path, dataset_path)
+        logger.info(f"Renamed '{export_path}' to '{dataset_path}' ({len(changes)} rows changed)")
+        return changes
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in (new_header or old_header) + [row for day, row in merged]:
+        sheet.append(row)
+    partial_path = dataset_path + ".part"
+    workbook.save(partial_path)
+    os.replace(partial_path, dataset_path)
+    os.remove(export_path)
+    logger.info(f"Merged {len(new_rows)} new rows into '{dataset_path}' ({len(merged)} rows month-to-date, "
+                f"{len(changes)} changed)")
+    return changes
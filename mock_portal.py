@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# ---------------------------------------------------------------------------
+# Local stand-in for the GMS portal, for offline benchmarks and regression
+# runs of download.py. It serves the login form (UserCtrl/PwdCtrl/btnLogin),
+# the Certification menu, a PGB Daily Gas Movement page with Kendo-style
+# NetworkCode and MeasurePointDropDownList dropdowns (including a minimal
+# jQuery/kendoDropDownList shim), a k-loading-image spinner while a search
+# runs, and an export endpoint that returns synthetic xlsx files.
+#
+# Run it on its own with:
+#     python mock_portal.py --port 8800 --latency 2
+#     GMS_BASE_URL=http://127.0.0.1:8800 python download.py
+import sys
+import json
+import time
+import uuid
+import random
+import zipfile
+import hashlib
+import argparse
+import threading
+from io import BytesIO
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+PORTAL_PREFIX = "/pltgtm"
+HOME_PATH = f"{PORTAL_PREFIX}/cmd.openseal?openSEAL_ck=ViewHome"
+PGB_PATH = f"{PORTAL_PREFIX}/cmd.openseal?openSEAL_ck=ViewPGBDailyGasMovement"
+LOGIN_PATH = f"{PORTAL_PREFIX}/cmd.openseal?openSEAL_ck=Login"
+API_PREFIX = f"{PORTAL_PREFIX}/PGBDailyGasMovement"
+
+# ---------------------------------------------------------------------------
+# Portal behaviour. Rates are applied per measurement point from a stable
+# hash of its name, so the same points misbehave on every run.
+class PortalConfig:
+    def __init__(self, networks=3, points=4, latency=1.0, cascade_latency=0.2,
+                 download_delay=0.0, missing_export_rate=0.0, empty_rate=0.0, seed=0):
+        self.networks = networks
+        self.points = points
+        self.latency = latency
+        self.cascade_latency = cascade_latency
+        self.download_delay = download_delay
+        self.missing_export_rate = missing_export_rate
+        self.empty_rate = empty_rate
+        self.seed = seed
+
+    def affected(self, name, rate, salt):
+        digest = hashlib.sha256(f"{self.seed}:{salt}:{name}".encode()).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32 < rate
+
+def build_catalog(config):
+    catalog = []
+    for i in range(config.networks):
+        code = f"N{i + 1:02d}"
+        points = [
+            {"text": f"MS {code}-{j + 1:02d} Metering Station", "value": f"{code}-MP{j + 1:02d}"}
+            for j in range(config.points)
+        ]
+        catalog.append({"text": f"PGB Network {chr(65 + i)}", "value": code, "points": points})
+    return catalog
+
+# ---------------------------------------------------------------------------
+# Synthetic export: one row per gas day in the requested range, written as a
+# minimal xlsx package with inline strings.
+def column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def build_xlsx(rows):
+    sheet_rows = []
+    for r, row in enumerate(rows, start=1):
+        cells = []
+        for c, value in enumerate(row):
+            ref = f"{column_letter(c)}{r}"
+            if isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            elif value is not None:
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+        sheet_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+    main_ns = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    rel_ns = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    package_rel_ns = "http://schemas.openxmlformats.org/package/2006/relationships"
+    parts = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{package_rel_ns}">'
+            f'<Relationship Id="rId1" Type="{rel_ns}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ),
+        "xl/workbook.xml": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="{main_ns}" xmlns:r="{rel_ns}">'
+            '<sheets><sheet name="PGB Daily Gas Movement" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{package_rel_ns}">'
+            f'<Relationship Id="rId1" Type="{rel_ns}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>'
+        ),
+        "xl/worksheets/sheet1.xml": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="{main_ns}">'
+            f'<sheetData>{"".join(sheet_rows)}</sheetData></worksheet>'
+        ),
+    }
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as package:
+        for name, content in parts.items():
+            package.writestr(name, content)
+    return buffer.getvalue()
+
+def parse_date(value, default):
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return default
+
+def movement_rows(network, point, start, end):
+    rows = []
+    day = start
+    while day <= end:
+        rng = random.Random(f"{point}:{day.isoformat()}")
+        volume = round(rng.uniform(5, 50), 3)
+        rows.append([day.strftime("%d/%m/%Y"), network, point, volume, round(volume * 1055.06, 2)])
+        day += timedelta(days=1)
+    return rows
+
+# ---------------------------------------------------------------------------
+# Pages.
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>GMS Login</title></head><body>
+<form method="post" action="{login_path}">
+  <label>User <input id="UserCtrl" name="UserCtrl" type="text"></label>
+  <label>Password <input id="PwdCtrl" name="PwdCtrl" type="password"></label>
+  <input type="submit" name="btnLogin" value="Login">
+</form>
+</body></html>"""
+
+MENU = """<ul class="menu">
+  <li><a href="#" id="certification">Certification</a>
+    <ul id="certification-menu" style="display:none">
+      <li><a href="{pgb_path}">PGB Daily Gas Movement</a></li>
+    </ul>
+  </li>
+</ul>
+<script>
+(function () {{
+  var link = document.getElementById('certification');
+  function open(e) {{ if (e) e.preventDefault(); document.getElementById('certification-menu').style.display = 'block'; }}
+  link.addEventListener('click', open);
+  link.addEventListener('mouseover', open);
+}})();
+</script>"""
+
+HOME_PAGE = """<!DOCTYPE html>
+<html><head><title>GMS Home</title></head><body>
+{menu}
+<h1>Welcome</h1>
+</body></html>"""
+
+PGB_PAGE = """<!DOCTYPE html>
+<html><head><title>PGB Daily Gas Movement</title>
+<style>
+  .k-dropdown {{ display: inline-block; position: relative; min-width: 260px; margin: 4px; }}
+  .k-dropdown-wrap {{ display: block; border: 1px solid #999; padding: 2px; cursor: pointer; }}
+  .k-list {{ position: absolute; left: 0; top: 100%; z-index: 10; background: #fff; border: 1px solid #999;
+             margin: 0; padding: 0; list-style: none; min-width: 260px; max-height: 200px; overflow-y: auto; }}
+  .k-list li {{ padding: 2px 4px; }}
+  .k-loading-mask {{ position: absolute; inset: 0; background: rgba(255,255,255,.6); }}
+  #grid {{ position: relative; min-height: 40px; }}
+</style>
+</head><body>
+{menu}
+<form id="pgb-form" method="GET" action="{api_prefix}/Export">
+  <span class="k-widget k-dropdown">
+    <span class="k-dropdown-wrap"><span class="k-input">Sila Pilih</span><span class="k-select"><span class="k-icon k-i-arrow-60-down"></span></span></span>
+    <input id="NetworkCode" name="NetworkCode" type="hidden" data-role="dropdownlist">
+    <ul id="NetworkCode_listbox" class="k-list" aria-hidden="true" style="display:none"></ul>
+  </span>
+  <span class="k-widget k-dropdown">
+    <span class="k-dropdown-wrap"><span class="k-input">Sila Pilih</span><span class="k-select"><span class="k-icon k-i-arrow-60-down"></span></span></span>
+    <input id="MeasurePointDropDownList" name="MeasurePoint" type="hidden" data-role="dropdownlist">
+    <ul id="MeasurePointDropDownList_listbox" class="k-list" aria-hidden="true" style="display:none"></ul>
+  </span>
+  <input id="DataProviderDatePicker" name="StartDate" type="text">
+  <input id="EndDateDatePicker" name="EndDate" type="text">
+  <button type="button" id="search" data-url="{api_prefix}/Search">Search</button>
+  <a id="PGBdailygasmovement-export" href="#" data-url="{api_prefix}/Export">Export</a>
+</form>
+<div id="grid" class="k-grid"><table><thead><tr><th>Gas Day</th><th>Network</th><th>Measurement Point</th><th>Volume (MMSCF)</th><th>Energy (GJ)</th></tr></thead><tbody></tbody></table></div>
+<script>
+(function () {{
+  var widgets = {{}};
+  function DropDown(id) {{
+    var self = this;
+    this.element = document.getElementById(id);
+    this.wrapper = this.element.parentNode;
+    this.input = this.wrapper.querySelector('.k-input');
+    this.icon = this.wrapper.querySelector('.k-select .k-icon');
+    this.list = document.getElementById(id + '_listbox');
+    this.options = {{dataTextField: 'text', dataValueField: 'value'}};
+    this.items = [];
+    this.handlers = {{}};
+    this.dataSource = {{data: function () {{ return self.items; }}}};
+    this.wrapper.querySelector('.k-dropdown-wrap').addEventListener('click', function () {{ self.toggle(); }});
+    this.list.addEventListener('click', function (e) {{
+      var li = e.target.closest('li');
+      if (!li) return;
+      self.select(Number(li.getAttribute('data-index')));
+      self.close();
+      self.trigger('change');
+    }});
+    widgets[id] = this;
+  }}
+  DropDown.prototype.setItems = function (items) {{
+    this.items = items;
+    this.list.innerHTML = items.map(function (item, i) {{
+      return '<li class="k-item" role="option" data-index="' + i + '">' + item.text + '</li>';
+    }}).join('');
+    this.select(-1);
+  }};
+  DropDown.prototype.open = function () {{ this.list.style.display = 'block'; this.list.setAttribute('aria-hidden', 'false'); }};
+  DropDown.prototype.close = function () {{ this.list.style.display = 'none'; this.list.setAttribute('aria-hidden', 'true'); }};
+  DropDown.prototype.toggle = function () {{ if (this.list.style.display === 'none') this.open(); else this.close(); }};
+  DropDown.prototype.select = function (index) {{
+    var item = this.items[index];
+    this.element.value = item ? item.value : '';
+    this.input.textContent = item ? item.text : 'Sila Pilih';
+  }};
+  DropDown.prototype.value = function (value) {{
+    if (value === undefined) return this.element.value;
+    for (var i = 0; i < this.items.length; i++) {{
+      if (String(this.items[i].value) === String(value)) {{ this.select(i); return; }}
+    }}
+  }};
+  DropDown.prototype.text = function () {{ return this.input.textContent; }};
+  DropDown.prototype.bind = function (name, handler) {{ (this.handlers[name] = this.handlers[name] || []).push(handler); }};
+  DropDown.prototype.trigger = function (name) {{
+    var self = this;
+    (this.handlers[name] || []).forEach(function (handler) {{ handler.call(self); }});
+  }};
+  window.jQuery = function (selector) {{
+    return {{data: function () {{ return widgets[String(selector).replace('#', '')]; }}}};
+  }};
+
+  var network = new DropDown('NetworkCode');
+  var point = new DropDown('MeasurePointDropDownList');
+  network.setItems({networks});
+  network.bind('change', function () {{
+    point.icon.className = 'k-icon k-i-loading';
+    point.setItems([]);
+    fetch('{api_prefix}/MeasurePoints?network=' + encodeURIComponent(network.value()), {{credentials: 'same-origin'}})
+      .then(function (r) {{ return r.json(); }})
+      .then(function (items) {{ point.setItems(items); point.icon.className = 'k-icon k-i-arrow-60-down'; }});
+  }});
+
+  var form = document.getElementById('pgb-form');
+  var grid = document.getElementById('grid');
+  var exportButton = document.getElementById('PGBdailygasmovement-export');
+  function params() {{ return new URLSearchParams(new FormData(form)).toString(); }}
+  document.getElementById('search').addEventListener('click', function () {{
+    var mask = document.createElement('div');
+    mask.className = 'k-loading-mask';
+    mask.innerHTML = '<span class="k-loading-text">Loading...</span><div class="k-loading-image"></div>';
+    grid.appendChild(mask);
+    fetch(this.getAttribute('data-url') + '?' + params(), {{credentials: 'same-origin'}})
+      .then(function (r) {{ return r.json(); }})
+      .then(function (data) {{
+        grid.removeChild(mask);
+        grid.querySelector('tbody').innerHTML = data.rows.length ? data.rows.map(function (row) {{
+          return '<tr>' + row.map(function (cell) {{ return '<td>' + cell + '</td>'; }}).join('') + '</tr>';
+        }}).join('') : '<tr class="k-grid-norecords"><td colspan="5">No records available.</td></tr>';
+        exportButton.style.display = data.export ? '' : 'none';
+      }});
+  }});
+  exportButton.addEventListener('click', function (e) {{
+    e.preventDefault();
+    window.location.href = this.getAttribute('data-url') + '?' + params();
+  }});
+}})();
+</script>
+</body></html>"""
+
+# ---------------------------------------------------------------------------
+# HTTP server.
+class MockPortalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"mock-portal: {format % args}\n")
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location, headers=None):
+        self.send(302, "", headers=dict(headers or {}, Location=location))
+
+    def session_id(self):
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "JSESSIONID" and value in self.server.sessions:
+                return value
+        return None
+
+    def query(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        if self.command == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            for name, values in parse_qs(self.rfile.read(length).decode("utf-8")).items():
+                params.setdefault(name, []).extend(values)
+        return parsed.path, {name: values[-1] for name, values in params.items()}
+
+    def do_GET(self):
+        self.route()
+
+    def do_POST(self):
+        self.route()
+
+    def route(self):
+        path, params = self.query()
+        with self.server.lock:
+            self.server.requests += 1
+        if path == f"{PORTAL_PREFIX}/cmd.openseal":
+            page = params.get("openSEAL_ck")
+            if page == "Login" and self.command == "POST":
+                return self.login(params)
+            if not self.session_id():
+                return self.send(200, LOGIN_PAGE.format(login_path=LOGIN_PATH))
+            if page == "ViewPGBDailyGasMovement":
+                return self.pgb_page()
+            return self.send(200, HOME_PAGE.format(menu=MENU.format(pgb_path=PGB_PATH)))
+        if not path.startswith(API_PREFIX):
+            return self.send(404, "Not found")
+        if not self.session_id():
+            # An expired session gets the login page, like the real portal.
+            return self.send(200, LOGIN_PAGE.format(login_path=LOGIN_PATH))
+        endpoint = path[len(API_PREFIX):]
+        if endpoint == "/MeasurePoints":
+            return self.measure_points(params)
+        if endpoint == "/Search":
+            return self.search(params)
+        if endpoint == "/Export":
+            return self.export(params)
+        return self.send(404, "Not found")
+
+    def login(self, params):
+        if not params.get("UserCtrl") or not params.get("PwdCtrl"):
+            return self.send(200, LOGIN_PAGE.format(login_path=LOGIN_PATH))
+        session = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.sessions.add(session)
+            self.server.logins += 1
+        self.redirect(HOME_PATH, {"Set-Cookie": f"JSESSIONID={session}; Path=/; HttpOnly"})
+
+    def pgb_page(self):
+        networks = [{"text": n["text"], "value": n["value"]} for n in self.server.catalog]
+        self.send(200, PGB_PAGE.format(menu=MENU.format(pgb_path=PGB_PATH), api_prefix=API_PREFIX,
+                                       networks=json.dumps(networks)))
+
+    def lookup(self, params):
+        network = next((n for n in self.server.catalog if n["value"] == params.get("NetworkCode")), None)
+        if network is None:
+            return None, None
+        point = next((p for p in network["points"] if p["value"] == params.get("MeasurePoint")), None)
+        return network, point
+
+    def measure_points(self, params):
+        time.sleep(self.config.cascade_latency)
+        network = next((n for n in self.server.catalog if n["value"] == params.get("network")), None)
+        self.send(200, json.dumps(network["points"] if network else []), "application/json")
+
+    def rows_for(self, params):
+        network, point = self.lookup(params)
+        if point is None:
+            return None, None, []
+        today = datetime.now().date()
+        start = parse_date(params.get("StartDate"), today.replace(day=1))
+        end = parse_date(params.get("EndDate"), today)
+        if self.config.affected(point["text"], self.config.empty_rate, "empty"):
+            return network, point, []
+        return network, point, movement_rows(network["text"], point["text"], start, end)
+
+    def search(self, params):
+        time.sleep(self.config.latency)
+        network, point, rows = self.rows_for(params)
+        has_export = point is not None and bool(rows) \
+            and not self.config.affected(point["text"], self.config.missing_export_rate, "export")
+        self.send(200, json.dumps({"rows": rows, "export": has_export}), "application/json")
+
+    def export(self, params):
+        network, point, rows = self.rows_for(params)
+        if point is None:
+            return self.send(400, "Unknown network or measurement point")
+        time.sleep(self.config.download_delay)
+        header = ["Gas Day", "Network", "Measurement Point", "Volume (MMSCF)", "Energy (GJ)"]
+        body = build_xlsx([["PGB Daily Gas Movement"], header] + rows)
+        with self.server.lock:
+            self.server.exports += 1
+        self.send(200, body, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", {
+            "Content-Disposition": 'attachment; filename="PGB Daily Gas Movement.xlsx"',
+        })
+
+class MockPortal:
+    def __init__(self, config=None, host="127.0.0.1", port=0, verbose=False):
+        self.config = config or PortalConfig()
+        self.server = ThreadingHTTPServer((host, port), MockPortalHandler)
+        self.server.daemon_threads = True
+        self.server.config = self.config
+        self.server.catalog = build_catalog(self.config)
+        self.server.sessions = set()
+        self.server.lock = threading.Lock()
+        self.server.verbose = verbose
+        self.server.requests = self.server.logins = self.server.exports = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def items(self):
+        return sum(len(network["points"]) for network in self.server.catalog)
+
+    def stats(self):
+        return {"requests": self.server.requests, "logins": self.server.logins, "exports": self.server.exports}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def add_config_arguments(parser):
+    parser.add_argument("--networks", type=int, default=3, help="Number of networks (default: 3).")
+    parser.add_argument("--points", type=int, default=4, help="Measurement points per network (default: 4).")
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds the search spinner stays up (default: 1).")
+    parser.add_argument("--cascade-latency", type=float, default=0.2,
+                        help="Seconds to reload the measurement point list after a network change (default: 0.2).")
+    parser.add_argument("--download-delay", type=float, default=0.0, help="Seconds before an export is served (default: 0).")
+    parser.add_argument("--missing-export-rate", type=float, default=0.0,
+                        help="Fraction of measurement points whose search hides the export button (default: 0).")
+    parser.add_argument("--empty-rate", type=float, default=0.0,
+                        help="Fraction of measurement points with no data: an empty grid and no export button (default: 0).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for choosing the misbehaving measurement points.")
+
+def config_from_args(args):
+    return PortalConfig(networks=args.networks, points=args.points, latency=args.latency,
+                        cascade_latency=args.cascade_latency, download_delay=args.download_delay,
+                        missing_export_rate=args.missing_export_rate, empty_rate=args.empty_rate, seed=args.seed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the GMS portal.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    portal = MockPortal(config_from_args(args), args.host, args.port, verbose=True).start()
+    print(f"Mock GMS portal on {portal.url} ({portal.items} measurement points). Ctrl+C to stop.")
+    try:
+        portal.thread.join()
+    except KeyboardInterrupt:
+        portal.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from gms_pgb import config, metrics, state
+
+# ---------------------------------------------------------------------------
+# Every test gets its own downloads folder, manifest and step spans, and a
+# fixed last complete gas day, so coverage and gap checks do not depend on
+# the clock.
+LAST_COMPLETE_DAY = date(2026, 10, 16)
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    base_dir = tmp_path / "downloads"
+    monkeypatch.setattr(config, "base_local_dir", str(base_dir))
+    monkeypatch.setattr(state, "state_dir", str(base_dir / ".state"))
+    monkeypatch.setattr(state, "manifest_path", str(base_dir / ".state" / "manifest.sqlite"))
+    monkeypatch.setattr(state, "manifest_conn", None)
+    monkeypatch.setattr(state, "last_complete_day", lambda: LAST_COMPLETE_DAY)
+    monkeypatch.setattr(metrics, "metrics_dir", str(base_dir / "metrics"))
+    monkeypatch.setattr(metrics, "spans_filename", str(base_dir / "metrics" / "steps.jsonl"))
+    monkeypatch.setattr(metrics, "step_spans", [])
+    yield base_dir
+    if state.manifest_conn is not None:
+        state.manifest_conn.close()
+
+HEADER = ["Gas Day", "Network", "Measurement Point", "Volume (MMSCF)", "Energy (GJ)"]
+
+def export_rows(network, measurement_point, first_day, last_day, volume=10.0, skip=()):
+    rows, day = [], first_day
+    while day <= last_day:
+        if day not in skip:
+            rows.append([day.strftime("%d/%m/%Y"), network, measurement_point, volume, round(volume * 1055.06, 2)])
+        day += timedelta(days=1)
+    return rows
+
+# A workbook laid out like a portal export: a title row, the column header
+# and one row per gas day.
+def write_export(path, rows, header=HEADER):
+    import openpyxl
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["PGB Daily Gas Movement"])
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
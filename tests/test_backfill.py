@@ -0,0 +1,30 @@
+from datetime import date
+
+from gms_pgb import config
+from gms_pgb.backfill import backfill_windows, backfill_month_folders, month_end
+
+def test_windows_never_cross_a_month_boundary():
+    assert backfill_windows(date(2026, 1, 20), date(2026, 3, 5), 31) == [
+        ("20/01/2026", "31/01/2026"),
+        ("01/02/2026", "28/02/2026"),
+        ("01/03/2026", "05/03/2026"),
+    ]
+
+def test_windows_are_at_most_window_days_long():
+    assert backfill_windows(date(2026, 4, 1), date(2026, 4, 30), 10) == [
+        ("01/04/2026", "10/04/2026"),
+        ("11/04/2026", "20/04/2026"),
+        ("21/04/2026", "30/04/2026"),
+    ]
+
+def test_single_day():
+    assert backfill_windows(date(2026, 2, 28), date(2026, 2, 28), 31) == [("28/02/2026", "28/02/2026")]
+
+def test_month_end_handles_leap_years():
+    assert month_end(date(2028, 2, 3)) == date(2028, 2, 29)
+    assert month_end(date(2026, 12, 31)) == date(2026, 12, 31)
+
+def test_month_folders_follow_the_windows(workspace):
+    windows = backfill_windows(date(2026, 1, 20), date(2026, 2, 10), 7)
+    assert backfill_month_folders(windows) == [config.month_folder_of(date(2026, 1, 1)),
+                                               config.month_folder_of(date(2026, 2, 1))]
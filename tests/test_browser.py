@@ -0,0 +1,42 @@
+from selenium.common.exceptions import StaleElementReferenceException
+
+from gms_pgb.browser import search_started
+
+class Row:
+    def __init__(self):
+        self.stale = False
+
+    def is_enabled(self):
+        if self.stale:
+            raise StaleElementReferenceException("stale element reference")
+        return True
+
+class Page:
+    def __init__(self, rows, spinner=False):
+        self.rows = rows
+        self.spinner = spinner
+
+    def find_elements(self, by, value):
+        if value == "k-loading-image":
+            return ["spinner"] if self.spinner else []
+        return self.rows
+
+def test_the_grid_of_the_previous_search_is_not_taken_as_loaded():
+    old_rows = [Row(), Row()]
+    page = Page(old_rows)
+    started = search_started(old_rows)
+    assert not started(page)
+    page.spinner = True
+    assert started(page)
+    page.spinner = False
+    for row in old_rows:
+        row.stale = True
+    page.rows = [Row()]
+    assert started(page)
+
+def test_a_first_search_starts_when_rows_appear():
+    page = Page([])
+    started = search_started([])
+    assert not started(page)
+    page.rows = [Row()]
+    assert started(page)
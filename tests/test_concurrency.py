@@ -0,0 +1,45 @@
+from gms_pgb.concurrency import AimdController
+
+def test_limit_grows_additively_while_latency_is_steady():
+    controller = AimdController("test", 1, 4)
+    controller.observe("search", 1.0)
+    assert controller.allowed == 2
+    for _ in range(20):
+        controller.observe("search", 1.0)
+    assert controller.allowed == 4  # capped at the maximum
+
+def test_failure_halves_the_limit_but_not_below_the_minimum():
+    controller = AimdController("test", 2, 16)
+    controller.set_limit(10, None)
+    controller.observe("export", 0.0, "button missing")
+    assert controller.allowed == 5
+    controller.observe("export", 0.0, "button missing")
+    controller.observe("export", 0.0, "button missing")
+    assert controller.allowed == 2
+    assert controller.decreases == 3
+
+def test_requests_in_flight_during_a_back_off_are_ignored():
+    controller = AimdController("test", 1, 16)
+    controller.set_limit(8, None)
+    controller.observe("search", 0.0, "timed out")
+    assert controller.allowed == 4
+    # Started ten seconds ago, before the back-off: no second halving.
+    controller.observe("search", 10.0, "timed out")
+    assert controller.allowed == 4
+
+def test_latency_rise_backs_off():
+    controller = AimdController("test", 1, 16)
+    controller.set_limit(8, None)
+    for _ in range(5):
+        controller.observe("search", 1.0)
+    before = controller.allowed
+    controller.observe("search", 5.0)
+    assert controller.allowed == before // 2
+
+def test_small_latency_rise_is_noise():
+    controller = AimdController("test", 1, 16)
+    controller.set_limit(8, None)
+    for _ in range(5):
+        controller.observe("search", 0.1)
+    controller.observe("search", 0.4)  # four times the baseline, but only 0.3 s slower
+    assert controller.allowed >= 8
@@ -0,0 +1,11 @@
+import os
+import subprocess
+import sys
+
+# The time zone is only switched by the CLI, not by importing the package.
+def test_importing_the_package_keeps_the_process_time_zone():
+    script = ("import time; from gms_pgb import cli, config; before = time.tzname; "
+              "config.apply_timezone(); print(before[0], time.tzname[0])")
+    output = subprocess.run([sys.executable, "-c", script], env={**os.environ, "TZ": "UTC"},
+                            capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["UTC", "+08"]
@@ -0,0 +1,39 @@
+from datetime import date
+
+from gms_pgb import http_export, state
+from gms_pgb.workbooks import read_dated_rows
+
+from conftest import export_rows, write_export
+
+START, END = "01/10/2026", "17/10/2026"
+ENDPOINTS = {"search_url": None, "export_url": "http://portal/export", "method": "GET",
+             "fields": {"network": "n", "measurement_point": "mp", "start_date": "s", "end_date": "e"}}
+
+def exported_file(monkeypatch, workspace, network, measurement_point, rows):
+    content = open(write_export(workspace / "response.xlsx", rows), "rb").read()
+    monkeypatch.setattr(http_export, "http_fetch_export", lambda *args: content)
+    return http_export.http_export_item(None, ENDPOINTS, network, measurement_point, START, END, {})
+
+def test_http_export_is_stored(workspace, monkeypatch):
+    download_dir = workspace / "download"
+    download_dir.mkdir(parents=True)
+    monkeypatch.setattr(http_export, "base_download_dir", str(download_dir))
+    rows = export_rows("N1", "MP1", date(2026, 10, 1), date(2026, 10, 16))
+    path = exported_file(monkeypatch, workspace, "N1", "MP1", rows)
+    assert state.store_download("N1", "MP1", path, START, END) == 16
+    stored = state.get_manifest().execute("SELECT status, file_path FROM items").fetchone()
+    assert stored[0] == "done"
+    assert len(read_dated_rows(stored[1])[1]) == 16
+    assert list(download_dir.iterdir()) == []
+
+def test_http_exports_of_points_with_the_same_name_do_not_collide(workspace, monkeypatch):
+    download_dir = workspace / "download"
+    download_dir.mkdir(parents=True)
+    monkeypatch.setattr(http_export, "base_download_dir", str(download_dir))
+    first, second = (
+        exported_file(monkeypatch, workspace, network, "MP1",
+                      export_rows(network, "MP1", date(2026, 10, 1), date(2026, 10, 16)))
+        for network in ("N1", "N2"))
+    assert first != second
+    assert read_dated_rows(first)[1][0][1][1] == "N1"
+    assert read_dated_rows(second)[1][0][1][1] == "N2"
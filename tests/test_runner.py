@@ -0,0 +1,50 @@
+import os
+import time
+import zipfile
+
+from gms_pgb import browser, runner
+from gms_pgb.runner import new_results, unfinished_items
+
+def test_crashed_worker_skips_only_items_without_an_outcome():
+    work_items = [("N1", f"MP{i}") for i in range(7)]
+    results = new_results()
+    results["downloaded"].append("MP0")
+    results["no_data"].append("N1 - MP1")
+    results["invalid"].append("N1 - MP2")
+    results["skipped"].append("N1 - MP3")
+    results["failures"].append(("N1 - MP4", "portal_timeout"))
+    assert unfinished_items(work_items, results) == ["N1 - MP5", "N1 - MP6"]
+
+class FakeWatcher:
+    def __init__(self, directory):
+        pass
+
+    def close(self):
+        pass
+
+def test_failed_store_removes_and_releases_the_download(workspace, tmp_path, monkeypatch):
+    downloads = []
+    def download(watcher, timeout):
+        path = tmp_path / f"export{len(downloads)}.xlsx"
+        path.write_bytes(b"not a workbook")
+        downloads.append(str(path))
+        return str(path)
+    for name, stub in {"select_dropdown": lambda level, text: True, "set_date_input": lambda value, start: None,
+                       "click_search": lambda: [], "wait_for_loading": lambda timeout, network_name, previous_rows: True,
+                       "search_result_empty": lambda: False, "click_export_button": lambda timeout: True,
+                       "wait_for_download": download}.items():
+        monkeypatch.setattr(browser, name, stub)
+    monkeypatch.setattr(runner, "DownloadWatcher", FakeWatcher)
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    def store_download(*args):
+        raise zipfile.BadZipFile("File is not a zip file")
+    monkeypatch.setattr(runner, "store_download", store_download)
+    released = []
+    monkeypatch.setattr(runner, "release_download", released.append)
+
+    results = new_results()
+    runner.process_measurement_point("N1", "MP1", "01/10/2026", "17/10/2026", results)
+    # Each attempt's file is removed and released, then the item gives up.
+    assert len(downloads) == 2 and released == downloads
+    assert not any(os.path.exists(path) for path in downloads)
+    assert results["failures"] == [("N1 - MP1", "download_missing")]
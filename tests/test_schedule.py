@@ -0,0 +1,45 @@
+import pytest
+
+from gms_pgb import metrics, schedule
+
+def test_lpt_shards_balances_predicted_work():
+    predicted = {("N", "A"): 10.0, ("N", "B"): 7.0, ("N", "C"): 6.0, ("N", "D"): 4.0, ("N", "E"): 3.0}
+    shards, loads = schedule.lpt_shards(list(predicted), predicted, 2)
+    assert sorted(loads) == [14.0, 16.0]  # greedy LPT: A+D, B+C+E
+    assert sorted(item for shard in shards for item in shard) == sorted(predicted)
+    for shard, load in zip(shards, loads):
+        assert sum(predicted[item] for item in shard) == load
+
+def test_lpt_shards_never_makes_empty_shards():
+    predicted = {("N", "A"): 5.0, ("N", "B"): 1.0}
+    shards, loads = schedule.lpt_shards(list(predicted), predicted, 4)
+    assert len(shards) == 2
+    assert sorted(loads) == [1.0, 5.0]
+
+def test_predict_durations_uses_the_median_for_unknown_items():
+    durations = {("N", "A"): 10.0, ("N", "B"): 20.0, ("N", "C"): 60.0}
+    predicted = schedule.predict_durations([("N", "A"), ("N", "D")], durations)
+    assert predicted == {("N", "A"): 10.0, ("N", "D"): 10.0}
+    assert schedule.predict_durations([("N", "D")], {}) == {}
+
+def finished_item_span(measurement_point, seconds, **tags):
+    with metrics.tagged_spans(**tags):
+        span = metrics.start_span("item", "N", measurement_point)
+    span.pop("start")
+    span["seconds"] = seconds
+    return span
+
+def test_record_durations_leaves_out_refetch_spans(workspace):
+    schedule.record_durations([
+        finished_item_span("A", 40.0),
+        finished_item_span("B", 30.0),
+        finished_item_span("B", 2.0, phase="refetch"),
+        dict(finished_item_span("C", 50.0), status="timeout"),
+    ])
+    assert schedule.load_durations() == {("N", "A"): 40.0, ("N", "B"): 30.0}
+    assert metrics.span_tags == {}
+
+def test_record_durations_smooths_with_history(workspace):
+    schedule.record_durations([finished_item_span("A", 40.0)])
+    schedule.record_durations([finished_item_span("A", 20.0)])
+    assert schedule.load_durations()[("N", "A")] == pytest.approx(30.0)
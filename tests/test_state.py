@@ -0,0 +1,35 @@
+from datetime import date
+
+from gms_pgb import state
+
+from conftest import export_rows, write_export
+
+START, END = "01/10/2026", "17/10/2026"
+
+def test_resume_skips_items_whose_incremental_window_moved(workspace):
+    work_items = [("N1", "MP1"), ("N1", "MP2")]
+    export = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", date(2026, 10, 1), date(2026, 10, 16)))
+    assert state.store_download("N1", "MP1", export, START, END) == 16
+
+    # The resumed run plans a later window for the stored item than the one
+    # it was recorded with, and must still skip it.
+    assert state.plan_windows(work_items, START, END, False) == {("N1", "MP1"): "17/10/2026"}
+    results = {"resumed": []}
+    assert state.filter_completed(work_items, state.completed_items(END), results) == [("N1", "MP2")]
+    assert results["resumed"] == ["N1 - MP1"]
+
+def test_resume_skips_no_data_items(workspace):
+    results = {"resumed": [], "no_data": []}
+    state.record_no_data(results, "N1", "MP2", START, END)
+    assert state.completed_items(END) == {("N1", "MP2")}
+
+def test_identical_export_leaves_the_workbook_unchanged(workspace):
+    rows = export_rows("N1", "MP1", date(2026, 10, 1), date(2026, 10, 16))
+    results = {"downloaded": [], "changed": [], "unchanged": [], "invalid": []}
+    for name in ("first.xlsx", "second.xlsx"):
+        changed_rows = state.store_download("N1", "MP1", write_export(workspace / name, rows), START, END)
+        state.note_stored(results, "N1", "MP1", changed_rows)
+    assert results["changed"] == ["N1 - MP1"]
+    assert results["unchanged"] == ["N1 - MP1"]
+    assert results["downloaded"] == ["MP1", "MP1"]
+    assert not (workspace / "second.xlsx").exists()
@@ -0,0 +1,124 @@
+from datetime import date
+
+from gms_pgb import state
+from gms_pgb.workbooks import read_dated_rows, store_workbook
+
+from conftest import HEADER, export_rows, write_export
+
+def october(day):
+    return date(2026, 10, day)
+
+def item_status(network, measurement_point, start_date_str, end_date_str):
+    row = state.get_manifest().execute(
+        "SELECT status FROM items WHERE network = ? AND measurement_point = ? AND start_date = ? AND end_date = ?",
+        (network, measurement_point, start_date_str, end_date_str)
+    ).fetchone()
+    return row and row[0]
+
+def test_missing_ranges_merges_consecutive_days():
+    days = {october(1): 1, october(2): 1, october(4): 1, october(7): 1}
+    assert state.missing_ranges(days, october(1), october(8)) == [(october(3), october(3)), (october(5), october(6)), (october(8), october(8))]
+    assert state.missing_ranges(days, october(1), october(2)) == []
+
+def test_validate_export_reports_gaps_through_the_last_complete_day(workspace):
+    path = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", october(1), october(17), skip={october(3), october(4)}))
+    # 17 October is still filling up, so it is never a gap.
+    assert state.validate_export("N1", "MP1", path, october(1), october(17)) == [(october(3), october(4))]
+
+def test_validate_export_rejects_a_different_date_range(workspace):
+    path = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", date(2026, 9, 1), date(2026, 9, 30)))
+    assert state.validate_export("N1", "MP1", path, october(1), october(17)) is None
+
+def test_validate_export_rejects_an_empty_export(workspace):
+    path = write_export(workspace / "export.xlsx", [])
+    assert state.validate_export("N1", "MP1", path, october(1), october(17)) is None
+
+def test_validate_export_records_header_drift(workspace):
+    rows = export_rows("N1", "MP1", october(1), october(16))
+    state.validate_export("N1", "MP1", write_export(workspace / "a.xlsx", rows), october(1), october(17))
+    new_header = HEADER[:3] + ["Volume (MMSCFD)", "Energy (GJ)"]
+    state.validate_export("N1", "MP1", write_export(workspace / "b.xlsx", rows, new_header), october(1), october(17))
+    row = state.get_validation_tables().execute("SELECT header FROM schemas").fetchone()
+    assert "Volume (MMSCFD)" in row[0]
+
+def test_empty_export_is_rejected_and_leaves_coverage_alone(workspace):
+    first = write_export(workspace / "first.xlsx", export_rows("N1", "MP1", october(1), october(10)))
+    assert state.store_download("N1", "MP1", first, "01/10/2026", "10/10/2026") == 10
+    assert state.covered_through("N1", "MP1", "2026-10") == october(10)
+
+    empty = write_export(workspace / "empty.xlsx", [])
+    assert state.store_download("N1", "MP1", empty, "11/10/2026", "17/10/2026") is None
+    assert item_status("N1", "MP1", "11/10/2026", "17/10/2026") == "failed"
+    assert state.covered_through("N1", "MP1", "2026-10") == october(10)
+    assert state.pending_gaps([("N1", "MP1")], "01/10/2026", "17/10/2026") == [
+        ("N1", "MP1", "11/10/2026", "16/10/2026")]
+
+def test_empty_first_export_creates_no_workbook(workspace):
+    empty = write_export(workspace / "empty.xlsx", [])
+    assert state.store_download("N1", "MP1", empty, "01/10/2026", "17/10/2026") is None
+    assert state.covered_through("N1", "MP1", "2026-10") is None
+    assert state.plan_windows([("N1", "MP1")], "01/10/2026", "17/10/2026", False) == {}
+
+def test_coverage_stops_the_day_before_the_first_gap(workspace):
+    path = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", october(1), october(16), skip={october(12), october(15)}))
+    assert state.store_download("N1", "MP1", path, "01/10/2026", "17/10/2026") == 14
+    assert state.covered_through("N1", "MP1", "2026-10") == october(11)
+    assert state.plan_windows([("N1", "MP1")], "01/10/2026", "17/10/2026", False) == {
+        ("N1", "MP1"): "12/10/2026"}
+
+def test_coverage_never_moves_back(workspace):
+    full = write_export(workspace / "full.xlsx", export_rows("N1", "MP1", october(1), october(16)))
+    state.store_download("N1", "MP1", full, "01/10/2026", "17/10/2026")
+    partial = write_export(workspace / "partial.xlsx", export_rows("N1", "MP1", october(1), october(10), volume=20.0))
+    state.store_download("N1", "MP1", partial, "01/10/2026", "10/10/2026")
+    assert state.covered_through("N1", "MP1", "2026-10") == october(16)
+
+def test_out_of_order_window_waits_for_the_days_before_it(workspace):
+    later = write_export(workspace / "later.xlsx", export_rows("N1", "MP1", october(11), october(16)))
+    state.store_download("N1", "MP1", later, "11/10/2026", "17/10/2026")
+    assert state.covered_through("N1", "MP1", "2026-10") is None
+    earlier = write_export(workspace / "earlier.xlsx", export_rows("N1", "MP1", october(1), october(10)))
+    state.store_download("N1", "MP1", earlier, "01/10/2026", "10/10/2026")
+    assert state.covered_through("N1", "MP1", "2026-10") == october(10)
+
+def test_gap_refetch_clears_the_gap_and_extends_coverage(workspace):
+    path = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", october(1), october(16), skip={october(15)}))
+    state.store_download("N1", "MP1", path, "01/10/2026", "17/10/2026")
+    assert state.pending_gaps([("N1", "MP1")], "01/10/2026", "17/10/2026") == [
+        ("N1", "MP1", "15/10/2026", "15/10/2026")]
+    refetch = write_export(workspace / "refetch.xlsx", export_rows("N1", "MP1", october(15), october(15)))
+    assert state.store_download("N1", "MP1", refetch, "15/10/2026", "15/10/2026") == 1
+    assert state.pending_gaps([("N1", "MP1")], "01/10/2026", "17/10/2026") == []
+    # The incremental window of 16 October is still the next one to extend coverage.
+    assert state.covered_through("N1", "MP1", "2026-10") == october(15)
+
+def test_gap_is_dropped_after_the_last_refetch(workspace):
+    path = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", october(1), october(16), skip={october(15)}))
+    state.store_download("N1", "MP1", path, "01/10/2026", "17/10/2026")
+    for attempt in range(state.MAX_GAP_REFETCHES):
+        assert state.pending_gaps([("N1", "MP1")], "01/10/2026", "17/10/2026")
+        empty = write_export(workspace / f"refetch{attempt}.xlsx", [])
+        assert state.store_download("N1", "MP1", empty, "15/10/2026", "15/10/2026") is None
+    assert state.pending_gaps([("N1", "MP1")], "01/10/2026", "17/10/2026") == []
+
+def test_no_data_refetch_counts_against_the_gap(workspace):
+    path = write_export(workspace / "export.xlsx", export_rows("N1", "MP1", october(1), october(16), skip={october(15)}))
+    state.store_download("N1", "MP1", path, "01/10/2026", "17/10/2026")
+    results = {"no_data": []}
+    for _ in range(state.MAX_GAP_REFETCHES):
+        state.record_no_data(results, "N1", "MP1", "15/10/2026", "15/10/2026")
+    assert results["no_data"] == ["N1 - MP1"] * state.MAX_GAP_REFETCHES
+    assert state.pending_gaps([("N1", "MP1")], "01/10/2026", "17/10/2026") == []
+
+def test_store_workbook_merges_a_window_into_the_stored_days(workspace):
+    dataset = write_export(workspace / "dataset.xlsx", export_rows("N1", "MP1", october(1), october(10)))
+    export = write_export(workspace / "export.xlsx",
+                          export_rows("N1", "MP1", october(5), october(12), volume=20.0, skip={october(7)}))
+    changes = store_workbook(dataset, export, october(5), october(12))
+    # 5, 6 and 8-10 October changed, 11-12 October are new, 7 October keeps its row.
+    assert len(changes) == 7
+    header_rows, dated_rows = read_dated_rows(dataset)
+    assert list(header_rows[-1]) == HEADER
+    assert [day for day, row in dated_rows] == [october(day) for day in range(1, 13)]
+    volumes = {day.day: row[3] for day, row in dated_rows}
+    assert volumes[4] == 10.0 and volumes[7] == 10.0 and volumes[5] == 20.0 and volumes[12] == 20.0